@@ -0,0 +1,79 @@
+"""
+Benchmark of the classifiers of learner.CLASSIFIERS on the labeled jobs of
+the database. The pipeline is fitted once, without a search, and every
+classifier is fitted on its transformed training features, resampled to
+multiples of their size, and scored on the test features. Only the
+classifiers are timed. libsvm's 'svc' scales about quadratically with the
+number of jobs; expect minutes above a few thousand.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.classifier_benchmark --sizes 0.25 0.5 1 2 4
+"""
+
+# Built-in imports
+import argparse
+from time import time
+
+# External imports
+import numpy as np
+import pandas as pd
+from sklearn.metrics import precision_score
+
+# Local imports
+from src.learner import CLASSIFIERS
+from src.learner import make_classifier
+from src.learner import load_labeled_data
+from src.learner import train
+from src.predictions import transform_features
+
+
+def benchmark_classifiers(F_train, y_train, F_test, y_test, sizes, names):
+    """
+    Args:
+        sizes: Multiples of the number of training jobs. Multiples above 1
+               repeat jobs.
+        names: Classifiers of CLASSIFIERS to fit
+
+    Returns:
+        List of dicts with the classifier, the number of jobs, the fit time
+        and the macro precision on the test features
+    """
+
+    rng = np.random.RandomState(42)
+    results = []
+    for size in sizes:
+        n = max(int(len(y_train) * size), len(np.unique(y_train)) * 2)
+        rows = rng.choice(len(y_train), n, replace=n > len(y_train))
+        for name in names:
+            classifier = make_classifier(name)
+            start = time()
+            classifier.fit(F_train[rows], y_train[rows])
+            results.append({
+                'classifier'     : name,
+                'n_jobs'         : n,
+                'fit_seconds'    : round(time() - start, 4),
+                'macro_precision': round(precision_score(
+                    y_test, classifier.predict(F_test), average='macro', zero_division=0), 4),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.25, 0.5, 1, 2, 4])
+    parser.add_argument('--classifiers', nargs='+', default=list(CLASSIFIERS),
+                        choices=list(CLASSIFIERS))
+    args = parser.parse_args()
+
+    X_train, X_test, y_train, y_test, le = load_labeled_data()
+    model = train(X_train, y_train, search=False)
+
+    results = pd.DataFrame(benchmark_classifiers(
+        transform_features(model, X_train), y_train.values,
+        transform_features(model, X_test), y_test.values,
+        args.sizes, args.classifiers
+    ))
+    for column in ['fit_seconds', 'macro_precision']:
+        print(f"\n{column}:")
+        print(results.pivot(index='n_jobs', columns='classifier', values=column))
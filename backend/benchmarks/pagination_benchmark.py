@@ -0,0 +1,123 @@
+"""
+Benchmark of /get_jobs pagination on a generated jobs table, comparing the
+original `ORDER BY strftime(date_created) ... OFFSET` query with keyset
+pagination over the (label, created_epoch, id) index.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.pagination_benchmark --rows 1000000
+"""
+
+# Built-in imports
+import os
+import random
+import argparse
+import tempfile
+import sqlite3 as sql
+from time import time
+from datetime import datetime, timedelta, timezone
+
+# Local imports
+from src.config import TABLE_NAME
+from src.schema import add_created_epoch
+from src.db import select_jobs_page
+from src.db import page_cursor
+
+
+LABELS = ['Uncategorized'] * 7 + ['Good', 'Maybe', 'Bad']
+
+
+def generate_table(conn, rows, seed=0):
+    """ A jobs table with `rows` jobs created over the last two years """
+
+    rng = random.Random(seed)
+    conn.execute(f"""
+        CREATE TABLE {TABLE_NAME} (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            snippet TEXT NOT NULL,
+            date_created TIMESTAMP_TZ,
+            label TEXT
+        )""")
+
+    newest = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    batch_size = 50000
+    for start in range(0, rows, batch_size):
+        conn.executemany(
+            f"INSERT INTO {TABLE_NAME} VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    f"~{i:012d}",
+                    f"Job {i}",
+                    "Lorem ipsum " * 20,
+                    (newest - timedelta(seconds=rng.randrange(2 * 365 * 86400))).isoformat(),
+                    rng.choice(LABELS)
+                )
+                for i in range(start, min(start + batch_size, rows))
+            ]
+        )
+    conn.commit()
+
+
+def offset_page(cur, labels, limit, offset):
+    """ The query of /get_jobs before created_epoch existed """
+    active_filter = ','.join(f'"{label}"' for label in labels)
+    return cur.execute(
+        f'SELECT * FROM {TABLE_NAME} WHERE label IN ({active_filter}) '
+        f'ORDER BY strftime("%Y-%m-%dT%H:%M:%SZ", date_created) DESC '
+        f'LIMIT {limit} OFFSET {offset}'
+    ).fetchall()
+
+
+def keyset_pages(cur, labels, limit, pages):
+    """ Seconds to fetch each page of `pages`, walking the pages with cursors """
+
+    timings, cursor = {}, None
+    for page in range(max(pages) + 1):
+        start = time()
+        rows = select_jobs_page(cur, labels, limit, cursor=cursor).fetchall()
+        if page in pages:
+            timings[page] = time() - start
+        if len(rows) < limit:
+            break
+        cursor = page_cursor(rows[-1])
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--pages', type=int, nargs='+', default=[0, 10, 100, 1000, 10000])
+    parser.add_argument('--filter', default='Good,Maybe,Bad')
+    args = parser.parse_args()
+
+    labels = args.filter.split(',')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sql.connect(os.path.join(tmp, 'jobs.sqlite3'))
+        conn.row_factory = sql.Row
+        cur = conn.cursor()
+
+        start = time()
+        generate_table(conn, args.rows)
+        print(f"Generated {args.rows} rows in {time() - start:.1f} seconds.")
+
+        offset_timings = {}
+        for page in args.pages:
+            start = time()
+            offset_page(cur, labels, args.limit, page * args.limit)
+            offset_timings[page] = time() - start
+
+        start = time()
+        add_created_epoch(conn)
+        print(f"Added created_epoch and its index in {time() - start:.1f} seconds.")
+
+        keyset_timings = keyset_pages(cur, labels, args.limit, set(args.pages))
+        conn.close()
+
+    print(f"{'page':>8} {'offset ms':>12} {'keyset ms':>12}")
+    for page in args.pages:
+        keyset = keyset_timings.get(page)
+        keyset = f"{keyset * 1000:>12.2f}" if keyset is not None else f"{'-':>12}"
+        print(f"{page:>8} {offset_timings[page] * 1000:>12.2f} {keyset}")
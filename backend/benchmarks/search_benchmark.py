@@ -0,0 +1,97 @@
+"""
+Offline benchmark of the concurrent downloader against a fake search API.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.search_benchmark --workers 1 4 8 --rate 2
+
+With --incremental, every configuration crawls twice using a throwaway crawl
+state: a first full download and a steady-state refresh after --new-jobs jobs
+have been posted.
+"""
+
+# Built-in imports
+import io
+import os
+import argparse
+import tempfile
+from time import time
+from contextlib import redirect_stdout
+
+# Local imports
+from src import config
+from src.config import SEARCH_TERMS
+from src.crawl_state import CrawlState
+from src.fake_search import FakeSearchApi
+from src.upwork_downloader import search_jobs
+
+
+def crawl(api, crawl_state=None):
+    pages = []
+    start = time()
+    calls = api.calls
+    rejected = api.rejected
+    with redirect_stdout(io.StringIO()): # Silence the downloader's progress
+        jobs = search_jobs(None, SEARCH_TERMS,
+            on_page     = lambda term, page: pages.append(len(page)),
+            api_class   = lambda client: api,
+            incremental = crawl_state is not None,
+            crawl_state = crawl_state
+        )
+    elapsed = time() - start
+
+    return {
+        'seconds'  : elapsed,
+        'calls'    : api.calls - calls,
+        'rejected' : api.rejected - rejected,
+        'pages'    : len(pages),
+        'jobs'     : len(jobs),
+        'jobs/sec' : len(jobs) / elapsed,
+    }
+
+
+def print_row(label, r):
+    print(f"{label:>12} {r['seconds']:>8.1f} {r['calls']:>6} {r['rejected']:>5} "
+          f"{r['pages']:>6} {r['jobs']:>6} {r['jobs/sec']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--rate', type=float, default=config.API_REQUESTS_PER_SECOND,
+        help='Requests per second allowed by the client-side limiter')
+    parser.add_argument('--burst', type=int, default=config.API_BURST)
+    parser.add_argument('--latency', type=float, default=0.5,
+        help='Seconds the fake API takes to answer')
+    parser.add_argument('--server-limit', type=int, default=2,
+        help='Calls per second accepted by the fake API before answering 429')
+    parser.add_argument('--jobs-per-term', type=int, default=config.MAX_ENTRIES_PER_TERM)
+    parser.add_argument('--max-entries', type=int, default=config.MAX_ENTRIES_PER_TERM)
+    parser.add_argument('--page-size', type=int, default=config.ENTRIES_PER_RESULT_PAGE)
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--new-jobs', type=int, default=10)
+    args = parser.parse_args()
+
+    config.API_REQUESTS_PER_SECOND = args.rate
+    config.API_BURST               = args.burst
+    config.MAX_ENTRIES_PER_TERM    = args.max_entries
+    config.ENTRIES_PER_RESULT_PAGE = args.page_size
+
+    print(f"{'':>12} {'seconds':>8} {'calls':>6} {'429s':>5} {'pages':>6} {'jobs':>6} {'jobs/sec':>9}")
+    for workers in args.workers:
+        config.SEARCH_WORKERS = workers
+        api = FakeSearchApi(
+            jobs_per_term  = args.jobs_per_term,
+            latency        = args.latency,
+            max_per_second = args.server_limit
+        )
+
+        if not args.incremental:
+            print_row(f"{workers} workers", crawl(api))
+            continue
+
+        with tempfile.TemporaryDirectory() as tmp:
+            crawl_state = CrawlState(os.path.join(tmp, 'crawl_state.sqlite3')).load()
+            print_row(f"{workers}w full", crawl(api, crawl_state))
+            api.post_jobs(args.new_jobs)
+            print_row(f"{workers}w refresh", crawl(api, crawl_state))
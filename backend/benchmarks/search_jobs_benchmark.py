@@ -0,0 +1,114 @@
+"""
+Benchmark of /search_jobs on a generated jobs table, comparing the FTS5
+index with a `LIKE '%word%'` scan of the title, snippet and skills.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.search_jobs_benchmark --rows 500000
+"""
+
+# Built-in imports
+import os
+import random
+import string
+import argparse
+import tempfile
+from time import time
+from itertools import accumulate
+from datetime import datetime, timedelta, timezone
+
+# Local imports
+from src import db
+from src import config
+from src import schema
+from src.fake_search import WORDS
+
+
+QUERIES = ['python', 'neural network', 'scrap', 'raspberry camera', 'opencv tracking']
+
+
+def generate_table(conn, rows, seed=0):
+    """
+    A jobs table with `rows` jobs. Titles and skills are made of the words
+    of the fake search API, snippets of Zipf-distributed random words.
+    """
+
+    rng = random.Random(seed)
+    vocabulary = [
+        ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+        for _ in range(20000)
+    ]
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    schema.create_jobs_table(conn)
+    fields = ['id', 'title', 'snippet', 'job_type', 'budget', 'job_status',
+              'category2', 'subcategory2', 'url', 'date_created', 'skills', 'label']
+    insert_sql = f"INSERT INTO {config.TABLE_NAME} ({','.join(fields)}) VALUES ({','.join('?' * len(fields))})"
+
+    newest = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    batch_size = 50000
+    for start in range(0, rows, batch_size):
+        conn.executemany(insert_sql, [
+            (
+                f"~{i:012d}",
+                ' '.join(rng.choices(WORDS, k=3)).capitalize(),
+                ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=60)),
+                'Hourly', 0, 'Open', 'IT', 'Other', f"https://example.com/{i}",
+                (newest - timedelta(seconds=rng.randrange(365 * 86400))).isoformat(),
+                ', '.join(rng.choices(WORDS, k=2)),
+                rng.choice(['Uncategorized', 'Good', 'Maybe', 'Bad']),
+            )
+            for i in range(start, min(start + batch_size, rows))
+        ])
+    conn.commit()
+
+
+def like_search(conn, text, limit):
+    """ What a search without the index would do, newest jobs first """
+    where, params = [], []
+    for word in text.split():
+        where.append("(title LIKE ? OR snippet LIKE ? OR skills LIKE ?)")
+        params += [f"%{word}%"] * 3
+    return conn.execute(
+        f"SELECT * FROM {config.TABLE_NAME} WHERE {' AND '.join(where)} "
+        f"ORDER BY created_epoch DESC LIMIT ?",
+        params + [limit]
+    ).fetchall()
+
+
+def measure(func, repeat=3):
+    """ Best time of `repeat` runs, in milliseconds, and the result """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time()
+        result = func()
+        best = min(best, time() - start)
+    return best * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--queries', nargs='+', default=QUERIES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'jobs.sqlite3')
+        conn = schema.connect(database)
+
+        start = time()
+        generate_table(conn, args.rows)
+        print(f"Generated {args.rows} rows in {time() - start:.1f} seconds.")
+
+        start = time()
+        schema.migrate(conn)
+        print(f"Migrated, including the search index, in {time() - start:.1f} seconds.")
+
+        config.DATABASE = database
+        print(f"{'query':>20} {'fts ms':>10} {'like ms':>10} {'fts page':>9}")
+        for text in args.queries:
+            fts_ms, found = measure(lambda: db.search_jobs(text, limit=args.limit))
+            like_ms, _ = measure(lambda: like_search(conn, text, args.limit))
+            print(f"{text:>20} {fts_ms:>10.2f} {like_ms:>10.2f} {len(found):>9}")
+        conn.close()
@@ -0,0 +1,81 @@
+"""
+Benchmark of SpacyPreprocessor tokenization on a synthetic corpus of job
+snippets, comparing the original one-document-at-a-time implementation with
+the batched, fast-path and multi-process ones. The token cache is disabled.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.tokenizer_benchmark --sizes 10000 100000
+"""
+
+# Built-in imports
+import random
+import string
+import argparse
+from time import time
+
+# External imports
+from spacy.lang.en.stop_words import STOP_WORDS
+
+# Local imports
+from src.preprocessors import SpacyPreprocessor
+
+
+def synthetic_snippets(n, words_per_doc=120, vocabulary_size=20000, seed=0):
+    """
+    Snippets made of Zipf-distributed words mixed with stop words and
+    punctuation, which is roughly how real job descriptions look.
+    """
+    rng = random.Random(seed)
+    vocabulary = [
+        ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+        for _ in range(vocabulary_size)
+    ]
+    vocabulary += sorted(STOP_WORDS) * 10
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(weights)
+
+    snippets = []
+    for _ in range(n):
+        words = rng.choices(vocabulary, weights, k=words_per_doc)
+        for i in range(8, len(words), rng.randint(8, 16)):
+            words[i] += rng.choice(['.', ',', '!', '?', ':'])
+        snippets.append(' '.join(words).capitalize())
+    return snippets
+
+
+def original(documents):
+    """ The implementation before batching: one tokenizer call per document """
+    preprocessor = SpacyPreprocessor(use_cache=False)
+    return [list(preprocessor.tokenize(doc)) for doc in documents]
+
+
+def measure(name, func, documents):
+    start = time()
+    func(documents)
+    elapsed = time() - start
+    print(f"{name:>24} {len(documents):>8} {elapsed:>9.1f} {len(documents) / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    variants = [
+        ('original', original),
+        ('batched', SpacyPreprocessor(
+            use_cache=False, batch_size=args.batch_size, fast_path=False).transform),
+        ('batched + fast path', SpacyPreprocessor(
+            use_cache=False, batch_size=args.batch_size).transform),
+        (f'{args.processes} processes + fast path', SpacyPreprocessor(
+            use_cache=False, batch_size=args.batch_size, n_process=args.processes).transform),
+    ]
+
+    print(f"{'':>24} {'docs':>8} {'seconds':>9} {'docs/sec':>10}")
+    for size in args.sizes:
+        documents = synthetic_snippets(size)
+        for name, func in variants:
+            measure(name, func, documents)
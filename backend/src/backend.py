@@ -1,26 +1,40 @@
 # Built-in imports
-import sqlite3 as sql
+import os
+from datetime import datetime, timezone
 
 # External imports
 from flask import Flask
 from flask import request
 from flask import jsonify
+from flask import Response
 from flask import render_template, send_from_directory
-from flask import g # for sqlite3
 from flask_cors import CORS
-import upwork
 
 # Local imports
-from src.config import DATABASE
-from src.config import SEARCH_TERMS
-from src.config import TABLE_NAME
 from src.config import TIMESTAMP_FORMAT
+from src.config import DOWNLOAD_INTERVAL_MINUTES
+from src.config import COLLAPSE_DUPLICATES
+from src.config import ONLINE_LEARNING
+from src.config import MODEL_BACKEND
 from src.upwork_downloader import load_api_key
-from src.upwork_downloader import load_access_token
-from src.upwork_downloader import search_jobs
-from src.upwork_downloader import add_records
+from src.upwork_downloader import create_client
+from src.upwork_downloader import download_jobs
+from src.planner import active_search_terms
 from src.learner import predict_unlabeled_jobs
+from src.scheduler import BackgroundWorker
 from src.exceptions import CredentialsNotFoundError
+from src import db
+from src import online
+from src import review
+from src import registry
+from src import training
+from src import profiling
+from src.schema import upgrade_database
+from src.db import page_cursor
+from src.db import parse_page_cursor
+from src.responses import respond
+from src.responses import shape
+from src.responses import requested_format
 
 
 app = Flask(
@@ -32,97 +46,119 @@ app = Flask(
 CORS(app)
 
 
-def get_conn():
-    """
-    From:
-    https://flask.palletsprojects.com/en/rtd/patterns/sqlite3/
-    """
+@app.before_request
+def label_queries():
+    """ Account the database queries of each request to its route """
+    db.set_label(request.endpoint)
 
-    conn = getattr(g, '_database', None)
-    if conn is None:
-        conn = g._database = sql.connect(DATABASE)
-    conn.row_factory = sql.Row
-    
-    return conn
+
+@app.teardown_request
+def clear_label(exception):
+    db.set_label(None)
 
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    """
+    Best unlabeled jobs of the window. With `retrain`, a training is queued
+    (see /train) and the jobs are ranked by the served model meanwhile; the
+    id of the training is returned in `training`.
+    """
     body = request.get_json()
     retrain = True if body.get('retrain') == "true" else False
     window_days = body.get('window', 2)
-    jobs, report = predict_unlabeled_jobs(retrain=retrain, n_jobs=20, window_days=window_days)
-    jobs = [job.to_dict() for job in jobs]
-    return jsonify({'msg': jobs, 'report':report.to_string()})
+    collapse = body.get('collapse', str(COLLAPSE_DUPLICATES).lower()) == "true"
+
+    training_id = training.trainer.submit() if retrain else None
+    if MODEL_BACKEND == 'batch' and registry.current_version() is None:
+        # Nothing to rank with until the first model is trained
+        training_id = training.trainer.submit()
+        return respond({'msg': [], 'report': {}, 'training': training_id})
+
+    jobs, report = predict_unlabeled_jobs(
+        retrain=False, n_jobs=20, window_days=window_days, collapse=collapse)
+    return respond({
+        'msg'     : shape(jobs),
+        'report'  : report.to_dict(orient='index'),
+        'training': training_id,
+    })
+
+
+@app.route('/train', methods=['POST'])
+def train():
+    """
+    Queue the training of a new batch model and return its id without waiting
+    for it. If a training is already queued or running, its id is returned
+    instead. The new model is served as soon as it's trained.
+    """
+    return jsonify({'msg': "Queued", 'id': training.trainer.submit()})
+
+
+@app.route('/train/status', methods=['GET'])
+def train_status():
+    """
+    Progress of a training, by default the most recent one: its stage, the
+    seconds each finished stage took and the estimated seconds left.
+    """
+
+    run_id = request.args.get('id')
+    status = training.status(run_id)
+    if status is None:
+        return jsonify({'msg': f"Unknown training {run_id or ''}".strip()}), 404
+
+    return jsonify({'msg': status})
+
+
+def run_download(run):
+    """ Download task of the background scheduler """
+    download_jobs(create_client(), active_search_terms(), progress=run)
+
+
+# Downloads run in a single background thread, on demand and every 
+# DOWNLOAD_INTERVAL_MINUTES
+downloader = BackgroundWorker(
+    'downloader',
+    run_download,
+    interval = DOWNLOAD_INTERVAL_MINUTES * 60
+)
 
 
 @app.route('/download', methods=['POST'])
 def download():
+    """
+    Queue a download and return its id without waiting for it. If a download
+    is already queued or running, its id is returned instead.
+    """
     try:
-        api_key, api_key_secret = load_api_key()
+        load_api_key()
     except CredentialsNotFoundError as e:
-        import os
         return jsonify({'msg': os.listdir("./data")})        
 
-    access_token, access_token_secret = load_access_token()
-    
-    client_config = upwork.Config({
-        'consumer_key': api_key,
-        'consumer_secret': api_key_secret,
-        'access_token': access_token,
-        'access_token_secret': access_token_secret
-    })
+    run_id = downloader.submit()
 
-    client = upwork.Client(client_config)
+    return jsonify({'msg': "Queued", 'id': run_id})
 
-    jobs = search_jobs(client, SEARCH_TERMS)
-    add_records(jobs)
 
-    return jsonify({'msg':"Done"})
+@app.route('/download/status', methods=['GET'])
+def download_status():
+    """ Progress of a download, by default the most recent one """
 
+    run_id = request.args.get('id')
+    status = downloader.status(run_id)
+    if status is None:
+        return jsonify({'msg': f"Unknown download {run_id or ''}".strip()}), 404
 
-@app.teardown_appcontext
-def close_connection(exception):
-    """ From https://flask.palletsprojects.com/en/rtd/patterns/sqlite3/ """
-    conn = getattr(g, '_database', None)
-    if conn is not None:
-        conn.close()
+    return jsonify({'msg': status})
 
 
 @app.route('/create_jobs_table', methods=['GET', 'POST'])
 def create_table():
+    """ Create the tables, or bring them up to date; see schema.py """
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        create_table_sql = """
-            CREATE TABLE {} (
-                id TEXT PRIMARY KEY,
-                title TEXT NOT NULL,
-                snippet TEXT NOT NULL,
-                job_type TEXT NOT NULL,
-                budget INTEGER NOT NULL,
-                job_status TEXT NOT NULL,
-                category2 TEXT NOT NULL,
-                subcategory2 TEXT NOT NULL,
-                url TEXT NOT NULL,
-                workload TEXT,
-                duration TEXT,
-                date_created TIMESTAMP_TZ,
-                skills TEXT,
-                "client.feedback" INTEGER,
-                "client.reviews_count" INTEGER,
-                "client.jobs_posted" INTEGER,
-                "client.payment_verification_status" TEXT,
-                "client.past_hires" INTEGER,
-                "client.country" TEXT,
-                label TEXT
-            )"""
-        create_table_sql = create_table_sql.format(TABLE_NAME)
-        cur.execute(create_table_sql)
-        conn.commit()
+        upgrade_database()
         msg = 'Table created'
     except Exception as e:
-        msg = 'Error when creating table'
+        msg = f'Error when creating table: {e}'
     finally:
         return jsonify({"msg": msg})
 
@@ -134,53 +170,139 @@ def get_jobs():
             limit = int(request.args.get('limit'))
             limit = limit if ((limit > 0) and (limit <1e6)) else 20
 
-            offset = int(request.args.get('offset'))
+            offset = int(request.args.get('offset', 0))
             offset = offset if (offset >= 0 and offset <1e6) else 0
 
+            cursor = request.args.get('cursor') or None
+            if cursor is not None:
+                parse_page_cursor(cursor)
+
             filters = request.args.get('filter', '')
-            if filters != '':
-                active_filter = ','.join(f'"{f.lower().title()}"' for f in filters.split(','))
-            else:
-                active_filter = ''
+            labels = [f.lower().title() for f in filters.split(',') if f != '']
+
+            collapse = request.args.get('collapse') == 'true'
+
+            requested_format()
         except Exception as e:
             msg = f"Trouble when parsing the given arguments:\n{e}"
             print(msg)
-            return jsonify({'msg': msg})
+            return respond({'msg': msg})
     else:
         msg = 'Missing parameters in the request'
         
-        return jsonify({'msg': msg})
+        return respond({'msg': msg})
     
     try:
-        cur = get_conn().cursor()        
-        select_sql = f'SELECT * FROM {TABLE_NAME} WHERE label IN ({active_filter}) ORDER BY strftime("%Y-%m-%dT%H:%M:%SZ", date_created) DESC LIMIT {limit} OFFSET {offset}'
-        cur.execute(select_sql)
-        rows = cur.fetchall()
-        data = [dict(row) for row in rows]
-        data = sorted(data, key=lambda k: k['date_created'])
+        # Newest first, as sorted by the query
+        data = db.get_jobs_page(labels, limit, offset, cursor, collapse)
+        next_cursor = page_cursor(data[-1]) if len(data) == limit else None
+        data = shape(data)
         msg = 'Success'
     
     except Exception as e:
         msg = f"Error in SELECT operation: {e}"
         print(msg)
         data = ''
+        next_cursor = None
     
     finally:
-        return jsonify({'msg':msg, 'data':data})
+        return respond({'msg':msg, 'data':data, 'next':next_cursor})
+
+
+def to_epoch(value):
+    """ Seconds since the epoch of an ISO date or timestamp, UTC if naive """
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
+
+
+@app.route('/search_jobs', methods = ['GET'])
+def search_jobs():
+    """
+    Jobs matching the words of `q` in their title, snippet or skills, best
+    match first. Optional: `filter` (labels), `since` and `until` (ISO dates),
+    `limit` and `offset`, and `fields` and `format`, see responses.py.
+    """
+    try:
+        text = request.args.get('q', '')
+        if text.strip() == '':
+            return respond({'msg': 'Missing the q parameter'}, 400)
+
+        limit = int(request.args.get('limit', 20))
+        limit = limit if ((limit > 0) and (limit <1e3)) else 20
+
+        offset = int(request.args.get('offset', 0))
+        offset = offset if (offset >= 0 and offset <1e6) else 0
+
+        filters = request.args.get('filter', '')
+        labels = [f.lower().title() for f in filters.split(',') if f != '']
+
+        since = request.args.get('since')
+        since = to_epoch(since) if since else None
+        until = request.args.get('until')
+        until = to_epoch(until) if until else None
+
+        requested_format()
+    except Exception as e:
+        msg = f"Trouble when parsing the given arguments:\n{e}"
+        print(msg)
+        return respond({'msg': msg}, 400)
+
+    try:
+        data = db.search_jobs(text, labels, since, until, limit, offset)
+        next_offset = offset + limit if len(data) == limit else None
+        data = shape(data)
+        msg = 'Success'
+    except Exception as e:
+        msg = f"Error in search: {e}"
+        print(msg)
+        data = ''
+        next_offset = None
+
+    return respond({'msg': msg, 'data': data, 'next': next_offset})
+
+
+@app.route('/review_queue', methods = ['GET'])
+def review_queue():
+    """
+    Unlabeled jobs the model is least sure about, to label next. Optional:
+    `limit`, `window` (days), `by` ('margin' or 'entropy'), and `fields` and
+    `format`, see responses.py.
+    """
+    try:
+        limit = int(request.args.get('limit', 20))
+        limit = limit if ((limit > 0) and (limit <1e3)) else 20
+
+        window_days = request.args.get('window')
+        window_days = float(window_days) if window_days else None
+
+        measure = request.args.get('by')
+        if measure is not None and measure not in review.ORDERS:
+            raise ValueError(f"'by' must be one of: {', '.join(review.ORDERS)}")
+
+        requested_format()
+    except Exception as e:
+        msg = f"Trouble when parsing the given arguments:\n{e}"
+        print(msg)
+        return respond({'msg': msg}, 400)
+
+    try:
+        data = shape(review.review_queue(limit, window_days, measure))
+        msg = 'Success'
+    except Exception as e:
+        msg = f"Error building the review queue: {e}"
+        print(msg)
+        data = ''
+
+    return respond({'msg': msg, 'data': data})
 
 
 @app.route('/count_jobs', methods = ['GET'])
 def count_jobs():
-    
-    count_sql = f"SELECT COUNT(*) from {TABLE_NAME} WHERE label NOT IN ('Uncategorized')"
 
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(count_sql)
-        rows = cur.fetchall()
-        data = [dict(row) for row in rows]
-        msg = data[0]['COUNT(*)']
+        msg = db.count_labeled_jobs()
         
     except Exception as e:
         msg = f"Error in query: {e}"
@@ -189,6 +311,16 @@ def count_jobs():
         return jsonify({'msg':msg})
 
 
+def learn_label(id, label):
+    """ Feed a new label to the online model; the label is saved regardless """
+    try:
+        seconds = online.learner.learn(id, label)
+        if seconds is not None:
+            print(f"Online model learned {id} as {label} in {seconds * 1000:.0f} ms.")
+    except Exception as e:
+        print(f"Error updating the online model: {e}")
+
+
 @app.route('/update_job', methods = ['GET', 'POST'])
 def update_job():
     
@@ -196,18 +328,13 @@ def update_job():
         id = request.args.get('id')
         label = request.args.get('label')
 
-    update_sql = f"UPDATE {TABLE_NAME} SET label=? WHERE id=?"
-
     try:
-        conn = get_conn()
-        cur = conn.cursor()        
-        cur.execute(update_sql, (label, id))
-        conn.commit()
-
-        if cur.rowcount < 1:
+        if db.update_label(id, label) < 1:
             msg = 'Failed to update, does that id exist? (msg by Manuel)'
         else:
             msg = 'Success'
+            if ONLINE_LEARNING:
+                learn_label(id, label)
 
     except Exception as e:
         msg = f"Error in UPDATE operation: {e}"
@@ -216,6 +343,19 @@ def update_job():
     finally:
         return jsonify({'msg':msg})
 
+
+@app.route('/metrics', methods = ['GET'])
+def metrics():
+    """ Time and memory of each step of the learning pipeline, for Prometheus """
+    return Response(profiling.prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/db_stats', methods = ['GET'])
+def db_stats():
+    """ Open database connections and time spent on queries per route """
+    return jsonify({'msg': db.stats.to_dict()})
+
+
 # This will be used to return the react app
 @app.route('/', defaults={'path': ''}, methods=['GET'])
 @app.route('/<path:path>')
@@ -224,5 +364,15 @@ def catch_all(path):
 
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    debug = True
+
+    # With debug=True the reloader imports this module in a watcher process
+    # and in the server process; only the server should download
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        upgrade_database()
+        downloader.start()
+        if ONLINE_LEARNING:
+            online.rebuilder.start()
+
+    app.run(host='0.0.0.0', port=5000, debug=debug)
     
\ No newline at end of file
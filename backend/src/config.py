@@ -7,10 +7,141 @@ ACCESS_TOKEN_FILENAME = '../access_token.secret'
 # Where to save all the downloaded jobs' data
 DATABASE = '../data/jobs_db.sqlite3'
 
+# Set on every connection, see schema.connect. WAL lets the UI read while a
+# download writes; journal_mode is stored in the database file.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous' : 'NORMAL',    # Durable enough with WAL, and much faster
+    'mmap_size'   : 256 * 2**20, # Bytes of the file read through mmap
+    'cache_size'  : -64 * 2**10, # Negative: size of the page cache in KiB
+}
+
+# Connections shared by the routes and the background tasks, see db.py
+DB_READERS = 4
+DB_CACHED_STATEMENTS = 256 # Prepared statements kept per connection
+
+# Model registry: one directory per trained version, see registry.py
+MODELS_DIR = '../data/models'
+MODEL_VERSIONS_TO_KEEP = 5 # Including the served one
+MODEL_CACHE_SIZE = 2       # Loaded models kept in memory
+
+# Score new jobs with the served model as they are downloaded. Jobs older than
+# SCORE_DAYS are only scored when /predict asks for them.
+SCORE_AT_INGEST = True
+SCORE_DAYS = 7
+
+# Classifier of the batch model, see learner.CLASSIFIERS: 'svc' (libsvm with a
+# linear kernel), 'linear_svc' (liblinear) or 'sgd'. Their fit times and test
+# scores are compared by benchmarks/classifier_benchmark.py.
+CLASSIFIER = 'linear_svc'
+
+# Hyperparameter search when training, see learner.train. SEARCH_MODE is
+# 'none' (fit the pipeline once), 'random' (SEARCH_CANDIDATES settings drawn
+# from SEARCH_SPACE) or 'halving' (successive halving of the same candidates:
+# all of them are tried on a few jobs, and only the best on more).
+# In SEARCH_SPACE, a list is a set of values and ('log', low, high) samples
+# SEARCH_LOG_SAMPLES values between low and high on a log scale; parameters
+# the classifier doesn't have are ignored.
+# With a PIPELINE_CACHE_DIR, the fitted spaCy and TF-IDF steps, and the whole
+# feature union, are cached there (sklearn's Pipeline memory), so candidates
+# that only change the SVD or the classifier reuse them. The cache is trimmed
+# to PIPELINE_CACHE_MB. It's off by default: the tokens already come from the
+# token cache, and with 6000 jobs hashing and storing the steps cost more
+# (85s per search) than refitting the TF-IDF (75s).
+SEARCH_MODE = 'random'
+SEARCH_SPACE = {
+    'classifier__C'                         : ('log', 0.1, 10),
+    'union__title_vec__svd__n_components'   : [100, 150, 200],
+    'union__snippet_vec__svd__n_components' : [50, 100, 150],
+}
+SEARCH_LOG_SAMPLES = 10
+SEARCH_CANDIDATES = 10
+SEARCH_CV_FOLDS = 3
+SEARCH_HALVING_FACTOR = 3
+SEARCH_N_JOBS = 7
+PIPELINE_CACHE_DIR = None # e.g. '../data/cache/pipeline'
+PIPELINE_CACHE_MB = 1024
+
+# Online model, see online.py. It learns each label as soon as /update_job
+# receives it and is rebuilt from all the labels every ONLINE_REBUILD_HOURS.
+# /predict ranks with it when MODEL_BACKEND is 'online', and with the
+# registry's served model when it's 'batch'.
+MODEL_BACKEND = 'batch'
+ONLINE_LEARNING = True
+LABELS = ['Bad', 'Good', 'Maybe'] # Classes, sorted like a LabelEncoder does
+ONLINE_HASH_BITS = 18             # 2**18 hashed features per text column
+ONLINE_ALPHA = 1e-4               # Regularization of the SGDClassifier
+ONLINE_EPOCHS = 5                 # Passes over the labels when rebuilding
+ONLINE_SAVE_EVERY = 10            # Labels learned between saves
+ONLINE_REBUILD_HOURS = 24
+ONLINE_HISTORY = 500              # Predictions kept for the online report
+
+# Review queue, see review.py: the unlabeled jobs of the last REVIEW_DAYS the
+# served model is least sure about, by REVIEW_UNCERTAINTY ('margin' or
+# 'entropy'). Out of REVIEW_CANDIDATES times the requested number of jobs, a
+# job is skipped when it's in the cluster of a job already picked or its
+# estimated similarity to one is above REVIEW_MAX_SIMILARITY.
+REVIEW_DAYS = 7
+REVIEW_UNCERTAINTY = 'margin'
+REVIEW_CANDIDATES = 5
+REVIEW_MAX_SIMILARITY = 0.5
+
+# Responses with jobs, see responses.py. Smaller bodies aren't worth the CPU
+# of compressing them.
+RESPONSE_GZIP_MIN_BYTES = 1024
+RESPONSE_GZIP_LEVEL = 6
+
+# Wall time, CPU time and peak memory of each step of the batch pipeline and
+# of loading jobs, see profiling.py. Served by /metrics and stored in the
+# meta.json of each new version. Peak memory is traced with tracemalloc,
+# which slows down every allocation: with it, transforming jobs took 4 times
+# as long with cached tokens and 7 times with spaCy tokenizing, so it's off
+# unless looking into memory.
+PROFILE_STEPS = True
+PROFILE_MEMORY = False
+
+# Model used before the registry existed, imported into it if found
 MODEL_FILENAME = 'model.pkl'
 
+# Counters of changes to the data, e.g. of labels
+DATA_VERSION_TABLE = 'data_version'
+
 TABLE_NAME = 'jobs'
 
+# Newest job seen per search term, used by incremental downloads
+CRAWL_STATE_TABLE = 'crawl_state'
+
+# Which search terms matched each job
+JOB_TERMS_TABLE = 'job_terms'
+
+# Full-text index of the titles, snippets and skills, see /search_jobs
+JOBS_FTS_TABLE = 'jobs_fts'
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0) # BM25 weight of title, snippet and skills
+
+# Near-duplicate detection at ingest, see dedupe.py. Bands of
+# MINHASH_PERMUTATIONS / MINHASH_BANDS rows make jobs with a similarity above
+# about (1 / MINHASH_BANDS) ** (MINHASH_BANDS / MINHASH_PERMUTATIONS) likely
+# candidates; ~0.7 with these values.
+DEDUPE_AT_INGEST = True
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16
+MINHASH_SHINGLE_SIZE = 3  # Tokens per shingle
+DUPLICATE_THRESHOLD = 0.8 # Minimum estimated Jaccard similarity
+SIGNATURES_TABLE = 'minhash_signatures'
+LSH_TABLE = 'lsh_buckets'
+
+# Label the uncategorized near-duplicates of a job when it's labeled, and new
+# jobs that are near-duplicates of a labeled one
+PROPAGATE_LABELS = True
+
+# Train on one job per cluster and label, and show one job per cluster in
+# /predict
+COLLAPSE_DUPLICATES = True
+
+# Tokenized titles and snippets, so that spaCy runs once per document
+TOKEN_CACHE_TABLE = 'token_cache'
+TOKENIZE_AT_INGEST = True
+
 # 'id' must be the first field
 FIELDS_NAMES = [
   'id',
@@ -35,6 +166,20 @@ FIELDS_NAMES = [
   'label'
 ]
 
+# Columns the model uses, by type, see learner.train. Jobs are loaded with
+# only these columns (and the ones needed to select them), in chunks of
+# LOAD_CHUNK_SIZE rows.
+NUMERIC_COLUMNS = [
+  'budget',
+  'client.feedback',
+  'client.reviews_count',
+  'client.jobs_posted',
+  'client.past_hires'
+]
+TEXT_COLUMNS = ['title', 'snippet']
+CATEGORICAL_COLUMNS = ['job_type', 'category2', 'client.country']
+LOAD_CHUNK_SIZE = 5000
+
 JOB_FIELDS = [
   'op_title',                # Job title
   'op_description',          # Job snippet
@@ -78,4 +223,27 @@ MAX_ENTRIES_PER_TERM = 20
 ENTRIES_PER_RESULT_PAGE = 100 # Do not increase more than 100
 DAYS_BACK_TO_SEARCH = 3
 
+# Concurrent downloader. The search API is shared by all the workers through a
+# token bucket, so SEARCH_WORKERS only overlaps the requests' latency while the
+# request rate stays bounded by API_REQUESTS_PER_SECOND.
+SEARCH_WORKERS = 4
+API_REQUESTS_PER_SECOND = 1 / 1.5 # Default API limit
+API_BURST = 1                     # Requests that can be made back to back
+API_MAX_RETRIES = 4               # On connection errors and HTTP 429
+API_BACKOFF_SECONDS = 2           # Doubled after each failed attempt
+
+# Only download the jobs posted after the newest one seen in the previous
+# download of each term, instead of DAYS_BACK_TO_SEARCH days every time
+INCREMENTAL_DOWNLOAD = True
+
+# Minutes between background downloads, 0 to only download on request
+DOWNLOAD_INTERVAL_MINUTES = 15
+
+# Search-term planner (python -m src.planner). When enabled, downloads only
+# search the smallest set of terms that found all the jobs of the last 
+# PLANNER_HISTORY_DAYS days, once at least PLANNER_MIN_JOBS jobs were seen.
+AUTO_PRUNE_SEARCH_TERMS = False
+PLANNER_HISTORY_DAYS = 14
+PLANNER_MIN_JOBS = 200
+
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
\ No newline at end of file
@@ -0,0 +1,84 @@
+# Built-in imports
+import math
+from datetime import datetime, timezone
+
+# Local imports
+from src import config
+from src import db
+
+
+class CrawlState:
+    """
+    Per-term crawl cursor: the newest job (date_created and id) seen for each
+    search term in a previous download. Incremental downloads use it to stop
+    paging as soon as they get back to jobs that are already in the database.
+
+    Cursors only move forward when all the pages of a term were fetched, so an
+    interrupted download is repeated from the old cursor next time.
+    """
+    def __init__(self, database=None):
+        self.database = database or config.DATABASE
+        self.cursors  = {} # term -> (date_created, id), as stored
+        self.pending  = {} # term -> (date_created, id), seen in this download
+
+    def load(self):
+        """ Read the cursors of all the terms from the database """
+
+        with db.read(self.database) as conn:
+            rows = conn.execute(
+                f"SELECT term, date_created, job_id FROM {config.CRAWL_STATE_TABLE}"
+            ).fetchall()
+        self.cursors = {
+            term: (datetime.fromisoformat(date_created), job_id)
+            for term, date_created, job_id in rows
+        }
+        return self
+
+    def days_to_search(self, term):
+        """ Number of days the search of a term has to look back """
+
+        cursor = self.cursors.get(term)
+        if cursor is None:
+            return config.DAYS_BACK_TO_SEARCH
+        elapsed = datetime.now(tz=timezone.utc) - cursor[0]
+        days = math.ceil(elapsed.total_seconds() / 86400)
+        return min(max(days, 1), config.DAYS_BACK_TO_SEARCH)
+
+    def is_new(self, term, job):
+        """ Whether a job was posted after the cursor of the term """
+
+        cursor = self.cursors.get(term)
+        if cursor is None:
+            return True
+        date_created = datetime.fromisoformat(job['date_created'])
+        return (date_created > cursor[0]) or \
+            (date_created == cursor[0] and job['id'] != cursor[1])
+
+    def observe(self, term, jobs):
+        """ Remember the newest job of a page, to be saved with `commit` """
+
+        for job in jobs:
+            date_created = datetime.fromisoformat(job['date_created'])
+            newest = self.pending.get(term) or self.cursors.get(term)
+            if newest is None or date_created > newest[0]:
+                self.pending[term] = (date_created, job['id'])
+
+    def commit(self, term):
+        """ Move the cursor of a fully fetched term forward """
+
+        cursor = self.pending.pop(term, None)
+        if cursor is None:
+            return
+        self.cursors[term] = cursor
+        with db.write(self.database) as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {config.CRAWL_STATE_TABLE} "
+                f"(term, date_created, job_id) VALUES (?, ?, ?)",
+                (term, cursor[0].isoformat(), cursor[1])
+            )
+
+    def discard(self, term):
+        """ Forget what was seen of a term whose download failed """
+
+        self.pending.pop(term, None)
+
@@ -0,0 +1,365 @@
+"""
+Access to the jobs database.
+
+Connections are opened once and reused: a pool of read connections and a
+single writer, shared by the Flask routes, the downloader and the learner.
+With WAL, readers never wait for the writer, and writes are serialized here
+instead of failing with "database is locked". Reused connections also keep
+sqlite3's cache of prepared statements warm.
+
+Every use of a connection is timed and accounted to the label of the current
+thread (the route of the request, or the background task), see `stats`.
+"""
+
+# Built-in imports
+import os
+import re
+import queue
+import threading
+import sqlite3 as sql
+from time import perf_counter
+from contextlib import contextmanager
+
+# Local imports
+from src import config
+from src.schema import connect
+from src.schema import upgrade_database
+
+
+class QueryStats:
+    """ Connections opened, in use and time spent on them per label """
+
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.opened = 0
+        self.in_use = 0
+        self.waits  = 0 # Times a reader had to wait for a free connection
+        self.labels = {} # label -> {'count', 'total', 'max'} in seconds
+
+    def record(self, label, seconds):
+        with self.lock:
+            entry = self.labels.setdefault(label, {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'connections_opened': self.opened,
+                'connections_in_use': self.in_use,
+                'reader_waits'      : self.waits,
+                'queries'           : {
+                    label: {
+                        'count'  : entry['count'],
+                        'mean_ms': round(1000 * entry['total'] / entry['count'], 3),
+                        'max_ms' : round(1000 * entry['max'], 3),
+                    }
+                    for label, entry in sorted(self.labels.items())
+                },
+            }
+
+
+stats = QueryStats()
+
+# Label of the work done by the current thread, see `set_label`
+_local = threading.local()
+
+
+def set_label(name):
+    """
+    Account the queries of this thread to `name`, e.g. the route being
+    served. Without a label, they are accounted to the thread's name.
+    """
+    _local.label = name
+
+
+def current_label():
+    return getattr(_local, 'label', None) or threading.current_thread().name
+
+
+class ConnectionPool:
+    """
+    Up to `readers` read connections, opened on demand, and one writer
+    connection used by one thread at a time.
+    """
+
+    def __init__(self, database=None, readers=None):
+        self.database = database or config.DATABASE
+        self.readers  = readers or config.DB_READERS
+        self.idle     = queue.LifoQueue()
+        self.created  = 0
+        self.lock     = threading.Lock()
+        self.writer   = None
+        self.writing  = threading.RLock()
+
+    def open(self):
+        conn = connect(
+            self.database,
+            timeout           = 30,
+            check_same_thread = False,
+            cached_statements = config.DB_CACHED_STATEMENTS,
+        )
+        conn.row_factory = sql.Row
+        with stats.lock:
+            stats.opened += 1
+        return conn
+
+    @contextmanager
+    def timed(self):
+        with stats.lock:
+            stats.in_use += 1
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            stats.record(current_label(), perf_counter() - start)
+            with stats.lock:
+                stats.in_use -= 1
+
+    @contextmanager
+    def read(self):
+        """ A connection for reads, returned to the pool after the block """
+
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.readers
+                if create:
+                    self.created += 1
+            if create:
+                conn = self.open()
+            else:
+                with stats.lock:
+                    stats.waits += 1
+                conn = self.idle.get()
+
+        try:
+            with self.timed():
+                yield conn
+        finally:
+            # Don't hand a connection with an open transaction to someone else
+            if conn.in_transaction:
+                conn.rollback()
+            self.idle.put(conn)
+
+    @contextmanager
+    def write(self):
+        """
+        The writer connection, for one thread at a time. The block's changes
+        are committed at its end, or rolled back if it raises.
+        """
+
+        with self.writing:
+            if self.writer is None:
+                self.writer = self.open()
+            with self.timed():
+                try:
+                    yield self.writer
+                    self.writer.commit()
+                except:
+                    self.writer.rollback()
+                    raise
+
+
+# Pools by absolute database path
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database=None):
+    """ The pool of a database, created and migrated on first use """
+
+    database = database or config.DATABASE
+    path = os.path.abspath(database)
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            upgrade_database(database)
+            pool = _pools[path] = ConnectionPool(database)
+    return pool
+
+
+def read(database=None):
+    return get_pool(database).read()
+
+
+def write(database=None):
+    return get_pool(database).write()
+
+
+def select_jobs_page(cur, labels, limit, offset=0, cursor=None, collapse=False):
+    """
+    A page of jobs with the given labels, newest first.
+
+    Pages are addressed by the `cursor` of the last job of the previous page
+    (keyset pagination) or, for older clients, by an `offset`. With a cursor,
+    each label is read from the (label, created_epoch, id) index starting at
+    the cursor, so a deep page costs as much as the first one. An offset has
+    to walk over every skipped row.
+
+    Args:
+        cur     : Cursor of a connection to the database
+        labels  : List of labels to include
+        limit   : Number of jobs in the page
+        offset  : Number of jobs to skip, ignored when a cursor is given
+        cursor  : Cursor returned with the previous page, see `page_cursor`
+        collapse: Only include the newest job of each cluster of
+                  near-duplicates, see dedupe.py
+
+    Returns:
+        The cursor, after executing the query
+    """
+
+    if not labels:
+        return cur.execute(f"SELECT * FROM {config.TABLE_NAME} WHERE 0")
+
+    placeholders = ','.join('?' * len(labels))
+    where, params = '', []
+    if cursor is not None:
+        epoch, job_id = parse_page_cursor(cursor)
+        where += " AND (j.created_epoch, j.id) < (?, ?)"
+        params += [epoch, job_id]
+    if collapse:
+        where += f"""
+            AND NOT EXISTS (
+                SELECT 1 FROM {config.TABLE_NAME} d
+                WHERE d.cluster_id = j.cluster_id AND d.label IN ({placeholders})
+                AND (d.created_epoch, d.id) > (j.created_epoch, j.id)
+            )"""
+        params += labels
+
+    if cursor is None and offset:
+        return cur.execute(
+            f"""SELECT * FROM {config.TABLE_NAME} j WHERE j.label IN ({placeholders}) {where}
+                ORDER BY j.created_epoch DESC, j.id DESC LIMIT ? OFFSET ?""",
+            [*labels, *params, limit, offset]
+        )
+
+    # One index range scan per label, merged; an IN over the labels would
+    # sort every matching row to find the first `limit` ones
+    per_label = f"""
+        SELECT * FROM (
+            SELECT * FROM {config.TABLE_NAME} j WHERE j.label = ? {where}
+            ORDER BY j.created_epoch DESC, j.id DESC LIMIT ?
+        )"""
+    query = ' UNION ALL '.join([per_label] * len(labels))
+    query += " ORDER BY created_epoch DESC, id DESC LIMIT ?"
+    return cur.execute(
+        query,
+        [p for label in labels for p in (label, *params, limit)] + [limit]
+    )
+
+
+def page_cursor(job):
+    """ Cursor of the page that follows `job` """
+    return f"{job['created_epoch']}:{job['id']}"
+
+
+def parse_page_cursor(cursor):
+    epoch, job_id = cursor.split(':', 1)
+    return int(epoch), job_id
+
+
+def get_jobs_page(labels, limit, offset=0, cursor=None, collapse=False):
+    """ See `select_jobs_page`. Returns a list of dicts. """
+    with read() as conn:
+        rows = select_jobs_page(conn.cursor(), labels, limit, offset, cursor, collapse).fetchall()
+    return [dict(row) for row in rows]
+
+
+def count_labeled_jobs():
+    with read() as conn:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM {config.TABLE_NAME} WHERE label NOT IN ('Uncategorized')"
+        ).fetchone()[0]
+
+
+def update_label(job_id, label):
+    """
+    Label a job and, with PROPAGATE_LABELS, its uncategorized near-duplicates.
+
+    Returns:
+        Number of updated jobs, not counting the near-duplicates
+    """
+    with write() as conn:
+        updated = conn.execute(
+            f"UPDATE {config.TABLE_NAME} SET label=? WHERE id=?", (label, job_id)
+        ).rowcount
+        if updated and config.PROPAGATE_LABELS and label != 'Uncategorized':
+            conn.execute(
+                f"""UPDATE {config.TABLE_NAME} SET label = ?
+                    WHERE label = 'Uncategorized' AND cluster_id = (
+                        SELECT cluster_id FROM {config.TABLE_NAME} WHERE id = ?
+                    )""",
+                (label, job_id)
+            )
+        return updated
+
+
+def match_query(text):
+    """
+    FTS5 query matching the jobs that contain every word of `text`, each as a
+    prefix: "pyth sci" finds "Python data science". Words are quoted, so the
+    FTS5 query syntax in user input is searched for literally.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_jobs(text, labels=None, since=None, until=None, limit=20, offset=0):
+    """
+    Jobs whose title, snippet or skills match `text`, best BM25 match first,
+    with title and skills matches weighted by SEARCH_WEIGHTS.
+
+    Args:
+        text  : Words to search, see `match_query`
+        labels: Optional list of labels to include
+        since : Only jobs created at or after this epoch
+        until : Only jobs created before this epoch
+        limit : Number of jobs in the page
+        offset: Number of jobs to skip
+
+    Returns:
+        List of dicts with the job and its 'rank' (lower is better)
+    """
+
+    query = match_query(text)
+    if not query:
+        return []
+
+    weights = ', '.join(str(float(w)) for w in config.SEARCH_WEIGHTS)
+    matches = f"""
+        SELECT rowid, bm25({config.JOBS_FTS_TABLE}, {weights}) AS rank
+        FROM {config.JOBS_FTS_TABLE} WHERE {config.JOBS_FTS_TABLE} MATCH ?"""
+    params = [query]
+
+    where = []
+    if labels:
+        where.append(f"j.label IN ({','.join('?' * len(labels))})")
+    if since is not None:
+        where.append("j.created_epoch >= ?")
+    if until is not None:
+        where.append("j.created_epoch < ?")
+    filters = [*(labels or []), *(x for x in (since, until) if x is not None)]
+
+    if not where:
+        # Rank the matches in the index alone and only read the page's jobs
+        matches += " ORDER BY rank LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        page, page_params = '', []
+    else:
+        page, page_params = "LIMIT ? OFFSET ?", [limit, offset]
+
+    with read() as conn:
+        rows = conn.execute(
+            f"""SELECT j.*, m.rank
+                FROM ({matches}) m
+                JOIN {config.TABLE_NAME} j ON j.search_key = m.rowid
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY m.rank
+                {page}""",
+            params + filters + page_params
+        ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,216 @@
+"""
+Near-duplicate detection of jobs, e.g. of a job reposted with a new id.
+
+Each job gets a MinHash signature of the word shingles of its tokenized title
+and snippet. The signature is split into MINHASH_BANDS bands, and every band
+is hashed into a bucket of a locality-sensitive hashing (LSH) index stored in
+the database. Jobs that share a bucket with a new job are its candidate
+duplicates: finding them takes a few index lookups instead of a comparison
+with every job. A candidate is a duplicate when the share of equal values of
+the two signatures, an estimate of the Jaccard similarity of their shingles,
+is at least DUPLICATE_THRESHOLD.
+
+Duplicates share a cluster_id: the id of the first job of the cluster that
+was indexed, which is the oldest one.
+"""
+
+# Built-in imports
+import zlib
+import hashlib
+
+# External imports
+import numpy as np
+
+# Local imports
+from src import db
+from src import config
+from src.preprocessors import SpacyPreprocessor
+
+
+# Mersenne prime 2^31 - 1: a * x + b fits in 64 bits for 31-bit a, x and b
+PRIME = np.uint64(2**31 - 1)
+
+
+class MinHasher:
+    """
+    MinHash signatures of `n_permutations` values, from random universal
+    hash functions (a * x + b) mod PRIME seeded with `seed`.
+    """
+    def __init__(self, n_permutations=None, bands=None, shingle_size=None, seed=0):
+        self.n_permutations = n_permutations or config.MINHASH_PERMUTATIONS
+        self.bands          = bands or config.MINHASH_BANDS
+        self.shingle_size   = shingle_size or config.MINHASH_SHINGLE_SIZE
+        self.seed           = seed
+        if self.n_permutations % self.bands != 0:
+            raise ValueError("MINHASH_PERMUTATIONS must be a multiple of MINHASH_BANDS")
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, PRIME, self.n_permutations, dtype=np.uint64)
+        self.b = rng.randint(0, PRIME, self.n_permutations, dtype=np.uint64)
+
+    def params(self):
+        """ Identifies the signatures and buckets this hasher produces """
+        return zlib.crc32(
+            f"{self.n_permutations}-{self.bands}-{self.shingle_size}-{self.seed}".encode()
+        )
+
+    def shingles(self, tokens):
+        """ Stable 31-bit hashes of the runs of `shingle_size` tokens """
+        k = min(self.shingle_size, len(tokens)) or 1
+        return np.array(sorted({
+            zlib.crc32(' '.join(tokens[i:i + k]).encode()) & 0x7fffffff
+            for i in range(max(len(tokens) - k + 1, 1))
+        }), dtype=np.uint64)
+
+    def signature(self, tokens):
+        """ Array of n_permutations uint32 values """
+        x = self.shingles(tokens)
+        hashes = (np.outer(x, self.a) + self.b) % PRIME
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def buckets(self, signature):
+        """ One (band, bucket) pair per band of the signature """
+        return [
+            (band, int.from_bytes(
+                hashlib.blake2b(rows.tobytes(), digest_size=8).digest(), 'little', signed=True
+            ))
+            for band, rows in enumerate(np.split(signature, self.bands))
+        ]
+
+
+def similarity(signature, other):
+    """ Estimated Jaccard similarity of the shingles behind two signatures """
+    return float(np.mean(signature == other))
+
+
+def reset_index(conn, params):
+    """ Forget the signatures and clusters made with other MinHash parameters """
+
+    row = conn.execute(
+        f"SELECT value FROM {config.DATA_VERSION_TABLE} WHERE key = 'minhash_params'"
+    ).fetchone()
+    if row is not None and row[0] == params:
+        return
+
+    if row is not None:
+        print("The MinHash parameters changed, clustering all the jobs again...")
+    conn.execute(f"DELETE FROM {config.LSH_TABLE}")
+    conn.execute(f"DELETE FROM {config.SIGNATURES_TABLE}")
+    conn.execute(f"UPDATE {config.TABLE_NAME} SET cluster_id = NULL WHERE cluster_id IS NOT NULL")
+    conn.execute(
+        f"INSERT OR REPLACE INTO {config.DATA_VERSION_TABLE} (key, value) VALUES ('minhash_params', ?)",
+        (params,)
+    )
+
+
+def find_cluster(conn, hasher, signature):
+    """
+    Cluster of the most similar indexed job, if it's a near-duplicate.
+
+    Returns:
+        The cluster_id, or None
+    """
+
+    # One primary key lookup per band
+    buckets = hasher.buckets(signature)
+    candidates = conn.execute(
+        f"""SELECT DISTINCT s.job_id, s.signature, j.cluster_id
+            FROM {config.LSH_TABLE} l
+            JOIN {config.SIGNATURES_TABLE} s ON s.job_id = l.job_id
+            JOIN {config.TABLE_NAME} j ON j.id = l.job_id
+            WHERE {' OR '.join(['(l.band = ? AND l.bucket = ?)'] * len(buckets))}""",
+        [value for bucket in buckets for value in bucket]
+    ).fetchall()
+
+    best, best_similarity = None, config.DUPLICATE_THRESHOLD
+    for job_id, other, cluster_id in candidates:
+        s = similarity(signature, np.frombuffer(other, dtype=np.uint32))
+        if s >= best_similarity:
+            best, best_similarity = cluster_id or job_id, s
+    return best
+
+
+def propagate_label(conn, cluster_id, job_id):
+    """
+    Give an uncategorized job the label of the newest labeled job of its
+    cluster, if there is one.
+    """
+    conn.execute(
+        f"""UPDATE {config.TABLE_NAME}
+            SET label = (
+                SELECT label FROM {config.TABLE_NAME}
+                WHERE cluster_id = ? AND label != 'Uncategorized'
+                ORDER BY created_epoch DESC LIMIT 1
+            )
+            WHERE id = ? AND label = 'Uncategorized' AND EXISTS (
+                SELECT 1 FROM {config.TABLE_NAME}
+                WHERE cluster_id = ? AND label != 'Uncategorized'
+            )""",
+        (cluster_id, job_id, cluster_id)
+    )
+
+
+def index_jobs(preprocessor=None, chunk_size=500):
+    """
+    Cluster the jobs that weren't clustered yet, oldest first: the new ones
+    after a download, or all of them the first time.
+
+    Args:
+        preprocessor: SpacyPreprocessor used to tokenize the jobs. Tokens are
+                      read from the token cache when it's enabled.
+        chunk_size  : Jobs clustered at a time
+
+    Returns:
+        Number of clustered jobs and how many of them are near-duplicates
+    """
+
+    preprocessor = preprocessor or SpacyPreprocessor()
+    hasher = MinHasher()
+    with db.write() as conn:
+        reset_index(conn, hasher.params())
+
+    n_clustered, n_duplicates = 0, 0
+    while True:
+        with db.read() as conn:
+            jobs = conn.execute(
+                f"""SELECT id, title, snippet FROM {config.TABLE_NAME}
+                    WHERE cluster_id IS NULL
+                    ORDER BY created_epoch, id LIMIT ?""",
+                (chunk_size,)
+            ).fetchall()
+        if not jobs:
+            break
+
+        # Same documents as in training, so the tokens come from the cache
+        titles   = preprocessor.transform([job['title'] for job in jobs])
+        snippets = preprocessor.transform([job['snippet'] for job in jobs])
+        signatures = [hasher.signature(t + s) for t, s in zip(titles, snippets)]
+
+        with db.write() as conn:
+            for job, signature in zip(jobs, signatures):
+                cluster_id = find_cluster(conn, hasher, signature)
+                if cluster_id is None:
+                    cluster_id = job['id']
+                else:
+                    n_duplicates += 1
+
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {config.SIGNATURES_TABLE} (job_id, signature) VALUES (?, ?)",
+                    (job['id'], signature.tobytes())
+                )
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {config.LSH_TABLE} (band, bucket, job_id) VALUES (?, ?, ?)",
+                    [(band, bucket, job['id']) for band, bucket in hasher.buckets(signature)]
+                )
+                conn.execute(
+                    f"UPDATE {config.TABLE_NAME} SET cluster_id = ? WHERE id = ?",
+                    (cluster_id, job['id'])
+                )
+                if config.PROPAGATE_LABELS and cluster_id != job['id']:
+                    propagate_label(conn, cluster_id, job['id'])
+
+        n_clustered += len(jobs)
+
+    if n_clustered:
+        print(f"Clustered {n_clustered} jobs, {n_duplicates} of them near-duplicates.")
+    return n_clustered, n_duplicates
@@ -0,0 +1,109 @@
+"""
+Estimators of the batch model that measure their own calls, see profiling.py.
+
+They are the scikit-learn and category_encoders classes with the same names,
+and SpacyPreprocessor, whose fit, fit_transform, transform, predict and
+decision_function are measured as the step named by their `profile_name`: the
+estimator's path in the pipeline, e.g. 'union__title_vec__tfidf', set by
+`name_steps`. The name is kept by `clone`, so the candidates of a search and
+the refit of the best one are measured too, although the candidates fitted in
+other processes only add to the totals of those processes. Estimators without
+a name, like the ones of the classifier benchmark, aren't measured.
+
+A call made by another measured call of the same estimator, e.g. the `fit` of
+a `fit_transform`, isn't measured again.
+"""
+
+# Built-in imports
+import functools
+
+# External imports
+import category_encoders as ce
+from sklearn import svm
+from sklearn import linear_model
+from sklearn import preprocessing
+from sklearn import decomposition
+from sklearn.feature_extraction import text
+
+# Local imports
+from src import profiling
+from src import preprocessors
+
+
+METHODS = ['fit', 'fit_transform', 'transform', 'predict', 'decision_function']
+
+
+def measured(method, function):
+    """ `function`, a method of an estimator, measured as a call of `method` """
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        active = profiling.local.__dict__.setdefault('estimators', set())
+        if self.profile_name is None or id(self) in active:
+            return function(self, *args, **kwargs)
+
+        active.add(id(self))
+        try:
+            with profiling.measure(self.profile_name, method):
+                return function(self, *args, **kwargs)
+        finally:
+            active.discard(id(self))
+
+    return wrapper
+
+
+def clone_with_name(self):
+    """ Clone that keeps the profile_name, which isn't a parameter """
+
+    clone = super(type(self), self).__sklearn_clone__()
+    clone.profile_name = self.profile_name
+    return clone
+
+
+def profiled(cls):
+    """ Subclass of the estimator class `cls` that measures its calls """
+
+    namespace = {
+        method: measured(method, getattr(cls, method))
+        for method in METHODS if hasattr(cls, method)
+    }
+    namespace.update({
+        '__module__'        : __name__,
+        '__qualname__'      : cls.__name__,
+        '__doc__'           : f"{cls.__name__} that measures its calls, see estimators.py",
+        '__sklearn_clone__' : clone_with_name,
+        'profile_name'      : None,
+    })
+    return type(cls.__name__, (cls,), namespace)
+
+
+SpacyPreprocessor = profiled(preprocessors.SpacyPreprocessor)
+StandardScaler = profiled(preprocessing.StandardScaler)
+TfidfVectorizer = profiled(text.TfidfVectorizer)
+TruncatedSVD = profiled(decomposition.TruncatedSVD)
+CatBoostEncoder = profiled(ce.CatBoostEncoder)
+SVC = profiled(svm.SVC)
+LinearSVC = profiled(svm.LinearSVC)
+SGDClassifier = profiled(linear_model.SGDClassifier)
+
+
+def name_steps(estimator, path=''):
+    """
+    Set the profile_name of the estimators of estimators.py in `estimator`, a
+    Pipeline or ColumnTransformer, to their path in it.
+    """
+
+    if hasattr(estimator, 'steps'):
+        children = [(name, step) for name, step in estimator.steps]
+    elif hasattr(estimator, 'transformers'):
+        transformers = getattr(estimator, 'transformers_', estimator.transformers)
+        children = [(name, transformer) for name, transformer, _ in transformers]
+    else:
+        children = []
+
+    for name, child in children:
+        name_steps(child, f"{path}__{name}" if path else name)
+
+    if hasattr(type(estimator), 'profile_name') and path:
+        estimator.profile_name = path
+    return estimator
@@ -3,3 +3,9 @@ class CredentialsNotFoundError(Exception):
     """ Raised if a there is a missing environment variable """
     def __str__(self):
         return "Error: Credentials file couldn't be accessed"
+
+
+class RateLimitedError(Exception):
+    """ Raised when the API answers that too many requests have been made """
+    def __str__(self):
+        return "Error: API rate limit exceeded"
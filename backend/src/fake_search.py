@@ -0,0 +1,130 @@
+# Built-in imports
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+# External imports
+import requests
+
+
+class FakeSearchApi:
+    """
+    Local stand-in for `upwork.routers.jobs.search.Api`, used to benchmark the
+    downloader without network access or API credentials.
+
+    Every term gets a reproducible list of jobs, newest first, drawn from a
+    shared pool so that overlapping terms return some of the same ids, like
+    the real API does. Calls sleep for `latency` seconds and fail with an HTTP
+    429 when more than `max_per_second` calls are made within one second.
+    """
+    def __init__(self, client=None, jobs_per_term=150, pool_size=1000,
+                 latency=0.3, max_per_second=2, days=3, seed=0):
+        self.jobs_per_term  = jobs_per_term
+        self.pool_size      = pool_size
+        self.latency        = latency
+        self.max_per_second = max_per_second
+        self.days           = days
+        self.seed           = seed
+        self.now            = datetime.now(tz=timezone.utc).replace(microsecond=0)
+        self.calls          = 0
+        self.rejected       = 0
+        self.recent         = deque()
+        self.lock           = threading.Lock()
+        self.pool           = [self.make_job(i) for i in range(pool_size)]
+        self.results        = {}
+
+    def make_job(self, i):
+        rng = random.Random(f"{self.seed}-{i}")
+        created = self.now - timedelta(seconds=rng.randint(0, self.days * 86400))
+        return {
+            'id'          : f'~fake{self.seed:02d}{i:08d}',
+            'title'       : f'Fake job {i}',
+            'snippet'     : ' '.join(rng.choice(WORDS) for _ in range(60)),
+            'job_type'    : rng.choice(['Hourly', 'Fixed']),
+            'budget'      : rng.randint(0, 2000),
+            'job_status'  : 'Open',
+            'category2'   : 'Data Science & Analytics',
+            'subcategory2': 'Machine Learning',
+            'url'         : f'http://www.upwork.com/jobs/~fake{self.seed:02d}{i:08d}',
+            'workload'    : None,
+            'duration'    : None,
+            'date_created': created.strftime("%Y-%m-%dT%H:%M:%S+0000"),
+            'skills'      : rng.sample(WORDS, 3),
+            'client'      : {
+                'feedback'                 : rng.randint(0, 5),
+                'reviews_count'            : rng.randint(0, 50),
+                'jobs_posted'              : rng.randint(0, 100),
+                'payment_verification_status': rng.choice(['VERIFIED', None]),
+                'past_hires'               : rng.randint(0, 20),
+                'country'                  : rng.choice(['United States', 'Peru', 'India']),
+            },
+        }
+
+    def post_jobs(self, n, seconds_ago=0):
+        """ Publish `n` new jobs, each one matching a few random terms """
+
+        rng = random.Random(f"{self.seed}-post-{len(self.pool)}")
+        created = datetime.now(tz=timezone.utc) - timedelta(seconds=seconds_ago)
+        for _ in range(n):
+            job = self.make_job(len(self.pool))
+            job['date_created'] = created.strftime("%Y-%m-%dT%H:%M:%S+0000")
+            self.pool.append(job)
+            terms = list(self.results)
+            for term in rng.sample(terms, min(3, len(terms))):
+                self.results[term].insert(0, job)
+        self.now = max(self.now, created.replace(microsecond=0))
+
+    def term_results(self, term):
+        """ Jobs matching a term, newest first """
+
+        if term not in self.results:
+            rng = random.Random(f"{self.seed}-{term}")
+            n = min(self.jobs_per_term, self.pool_size)
+            jobs = rng.sample(self.pool, n)
+            jobs.sort(key=lambda job: job['date_created'], reverse=True)
+            self.results[term] = jobs
+        return self.results[term]
+
+    def check_rate(self):
+        with self.lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 1:
+                self.recent.popleft()
+            if len(self.recent) >= self.max_per_second:
+                self.rejected += 1
+                response = requests.models.Response()
+                response.status_code = 429
+                raise requests.exceptions.HTTPError(
+                    "429 Client Error: Too Many Requests", response=response)
+            self.recent.append(now)
+
+    def find(self, params):
+        """ Mimics `search.Api.find`, returning a dict with a 'jobs' list """
+
+        self.check_rate()
+        time.sleep(self.latency)
+
+        term = ' '.join(params['q'])
+        oldest = self.now - timedelta(days=params.get('days_posted', self.days))
+        jobs = [
+            job for job in self.term_results(term)
+            if datetime.strptime(job['date_created'], "%Y-%m-%dT%H:%M:%S%z") >= oldest
+        ]
+
+        offset, count = (int(x) for x in params['paging'].split(';'))
+        page = jobs[offset:offset + count]
+
+        # The caller modifies the jobs in place
+        return {'jobs': [dict(job) for job in page]}
+
+
+WORDS = [
+    'python', 'model', 'data', 'learning', 'vision', 'image', 'api', 'scraper',
+    'neural', 'network', 'pandas', 'opencv', 'arduino', 'sensor', 'robot',
+    'classification', 'regression', 'forecast', 'series', 'detection', 'aws',
+    'deploy', 'dashboard', 'report', 'analysis', 'segmentation', 'tracking',
+    'optimization', 'algorithm', 'path', 'planning', 'raspberry', 'camera',
+]
@@ -2,22 +2,18 @@
 from datetime import timedelta
 from datetime import datetime
 import sqlite3 as sql
-from pathlib import Path
 from time import time
-import pickle
 
 # External imports
 import pytz
+from joblib import Memory
 import pandas as pd
 import numpy as np
-from sklearn import svm
-import category_encoders as ce
-from sklearn.preprocessing import StandardScaler
 from sklearn.preprocessing import LabelEncoder
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import TruncatedSVD
 from sklearn.model_selection import train_test_split
-from sklearn.model_selection import GridSearchCV
+from sklearn.experimental import enable_halving_search_cv # Enables HalvingRandomSearchCV
+from sklearn.model_selection import RandomizedSearchCV
+from sklearn.model_selection import HalvingRandomSearchCV
 from sklearn.model_selection import StratifiedKFold
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
@@ -27,16 +23,90 @@ from sklearn.metrics import make_scorer
 
 # Local imports
 from src.config import TIMESTAMP_FORMAT
-from src.preprocessors import SpacyPreprocessor
+from src.config import COLLAPSE_DUPLICATES
+from src.config import MODEL_BACKEND
+from src.config import LABELS
+from src.config import CLASSIFIER
+from src.config import SEARCH_MODE
+from src.config import SEARCH_SPACE
+from src.config import SEARCH_LOG_SAMPLES
+from src.config import SEARCH_CANDIDATES
+from src.config import SEARCH_CV_FOLDS
+from src.config import SEARCH_HALVING_FACTOR
+from src.config import SEARCH_N_JOBS
+from src.config import PIPELINE_CACHE_DIR
+from src.config import PIPELINE_CACHE_MB
+from src.config import NUMERIC_COLUMNS
+from src.config import CATEGORICAL_COLUMNS
+from src.preprocessors import identity # Also referenced by pickled models
 from src.utils import load_database_data
-from src.config import MODEL_FILENAME
+from src.utils import data_fingerprint
+from src.estimators import SpacyPreprocessor
+from src.estimators import StandardScaler
+from src.estimators import TfidfVectorizer
+from src.estimators import TruncatedSVD
+from src.estimators import CatBoostEncoder
+from src.estimators import SVC
+from src.estimators import LinearSVC
+from src.estimators import SGDClassifier
+from src.estimators import name_steps
+from src import profiling
+from src.scheduler import Stages
+from src import registry
+from src import online
+from src import scoring
+from src.predictions import final_estimator
+from src.predictions import transform_features
+from src.predictions import score_jobs
+from src.predictions import load_scored_jobs
 
 pd.set_option('display.max_colwidth', 1000)
 
+# Classes shown by /predict, in order
+SELECTION_ORDER = ['Good', 'Maybe', 'Bad']
 
-def identity(arg):
-    """ Simple identity function used in TfidfVEctorizer as passthrough"""
-    return arg
+# Only show jobs predicted as Bad below this score
+MAX_BAD_SCORE = 0.3
+
+
+# Linear classifiers of the batch model, by name. They are interchangeable:
+# all of them have a one-vs-rest decision_function, from which the predicted
+# class and the pseudo-probabilities are derived, see predict_scores.
+CLASSIFIERS = {
+    # libsvm: fitting scales about quadratically with the number of jobs
+    'svc': lambda: SVC(
+        C                       = 1.4,
+        kernel                  = 'linear',
+        decision_function_shape = 'ovr',
+        class_weight            = 'balanced'
+    ),
+    # liblinear: about linear, and solving the primal problem is fastest
+    # when there are more jobs than features
+    'linear_svc': lambda: LinearSVC(
+        C            = 1.4,
+        dual         = False,
+        class_weight = 'balanced',
+        max_iter     = 5000
+    ),
+    # Stochastic gradient descent of the same hinge loss
+    'sgd': lambda: SGDClassifier(
+        loss         = 'hinge',
+        alpha        = 1e-3,
+        class_weight = 'balanced',
+        max_iter     = 1000,
+        tol          = 1e-4,
+        random_state = 42
+    ),
+}
+
+
+def make_classifier(name=None):
+    """ Unfitted classifier named `name` in CLASSIFIERS, by default CLASSIFIER """
+
+    name = name or CLASSIFIER
+    if name not in CLASSIFIERS:
+        raise ValueError(f"Unknown classifier '{name}', use one of: {', '.join(CLASSIFIERS)}")
+    return CLASSIFIERS[name]()
 
 
 def gen_parameters_from_log_space(low_value=0.0001, high_value=0.001, n_samples=5):
@@ -55,6 +125,101 @@ def gen_parameters_from_log_space(low_value=0.0001, high_value=0.001, n_samples=
     return 10 ** r
 
 
+def search_space(pipeline, space=None):
+    """
+    Candidate values of each parameter of `space`, by default SEARCH_SPACE,
+    with its ('log', low, high) ranges sampled with
+    gen_parameters_from_log_space. Parameters the pipeline doesn't have, e.g.
+    the C of an SGD classifier, are left out.
+    """
+
+    space = SEARCH_SPACE if space is None else space
+    params = pipeline.get_params()
+    distributions = {}
+    for name, values in space.items():
+        if name not in params:
+            print(f"Not searching {name}: the pipeline has no such parameter.")
+            continue
+        if isinstance(values, tuple) and values[0] == 'log':
+            _, low, high = values
+            values = gen_parameters_from_log_space(low, high, n_samples=SEARCH_LOG_SAMPLES)
+        distributions[name] = list(values)
+    return distributions
+
+
+def make_searcher(pipeline, mode=None):
+    """
+    Search object of SEARCH_MODE over the search space, or None if the mode
+    is 'none'.
+    """
+
+    mode = mode or SEARCH_MODE
+    if mode == 'none':
+        return None
+
+    distributions = search_space(pipeline)
+
+    # With scoring="ovo", computes the average AUC of all possible pairwise 
+    # combinations of classes. Insensitive to class imbalance when 
+    # average='macro'.
+    # Also see: https://stackoverflow.com/a/62471736/1253729
+    scorer = make_scorer(
+        score_func    = precision_score,
+        average       = "macro",
+        zero_division = 0
+    )
+
+    common = dict(
+        estimator           = pipeline,
+        param_distributions = distributions,
+        n_jobs              = SEARCH_N_JOBS,
+        return_train_score  = True,
+        refit               = True,
+        verbose             = 1,
+        cv                  = StratifiedKFold(n_splits=SEARCH_CV_FOLDS),
+        scoring             = scorer,
+        random_state        = 42,
+    )
+
+    if mode == 'random':
+        return RandomizedSearchCV(n_iter=SEARCH_CANDIDATES, **common)
+    if mode == 'halving':
+        return HalvingRandomSearchCV(
+            n_candidates  = SEARCH_CANDIDATES,
+            factor        = SEARCH_HALVING_FACTOR,
+            min_resources = 'exhaust',
+            **common
+        )
+    raise ValueError(f"Unknown SEARCH_MODE '{mode}', use 'none', 'random' or 'halving'")
+
+
+def without_memory(model):
+    """ Stop a fitted model from caching, so that it doesn't refer to the cache """
+
+    estimator = final_estimator(model)
+    estimator.set_params(**{
+        name: None for name in estimator.get_params() if name.endswith('memory')
+    })
+    return model
+
+
+def search_timings(model):
+    """ Seconds spent in each stage of a search, for the training report """
+
+    if not hasattr(model, 'cv_results_'):
+        return {}
+
+    # One row per candidate and, with halving, per round it took part in
+    results = model.cv_results_
+    return {
+        'search_candidates'   : len(results['params']),
+        'search_fit_seconds'  : float(np.sum(results['mean_fit_time']) * SEARCH_CV_FOLDS),
+        'search_score_seconds': float(np.sum(results['mean_score_time']) * SEARCH_CV_FOLDS),
+        'mean_fit_seconds'    : float(np.mean(results['mean_fit_time'])),
+        'refit_seconds'       : float(model.refit_time_),
+    }
+
+
 def train(X_train, y_train, search=True):
     """
     Pass the data through a pipeline and return a trained model.
@@ -62,27 +227,23 @@ def train(X_train, y_train, search=True):
     Args:
         X_train: Train data
         y_train: Labels for the train data
-        search : Whether to search for the best hyperparameters
+        search : Whether to search for the best hyperparameters, with
+                 SEARCH_MODE
     """
 
-    classifier = svm.SVC(
-        C                       = 1.4,
-        kernel                  = 'linear', 
-        decision_function_shape = 'ovr',
-        class_weight            = 'balanced'
-    )
+    classifier = make_classifier()
+
+    # Fitted steps are cached by their parameters and input data: the
+    # tokenization and the TF-IDF of each fold are computed once for all the
+    # candidates, and the whole union once for those that only change the
+    # classifier
+    memory = Memory(PIPELINE_CACHE_DIR, verbose=0) if PIPELINE_CACHE_DIR else None
 
     pipeline = Pipeline([
         # Use ColumnTransformer to combine the features from subject and body
         ('union', ColumnTransformer(
             [
-                ('scaler', StandardScaler(), [
-                    'budget',
-                    'client.feedback',
-                    'client.reviews_count',
-                    'client.jobs_posted',
-                    'client.past_hires'
-                ]),
+                ('scaler', StandardScaler(), NUMERIC_COLUMNS),
 
                 ('title_vec', Pipeline([
                     ('preprocessor', SpacyPreprocessor()), # tokenization, stop-words, lemmatization
@@ -94,7 +255,7 @@ def train(X_train, y_train, search=True):
                         ngram_range  = (1,2)
                     )),
                     ('svd', TruncatedSVD(n_components=150)),
-                ]), 'title'),
+                ], memory=memory), 'title'),
 
                 ('snippet_vec', Pipeline([
                     ('preprocessor', SpacyPreprocessor()), # tokenization, stop-words, lemmatization
@@ -107,85 +268,58 @@ def train(X_train, y_train, search=True):
                         ngram_range  = (1,2)
                     )),
                     ('svd', TruncatedSVD(n_components=100)),
-                ]), 'snippet'),
+                ], memory=memory), 'snippet'),
                 
-                ('cat', ce.CatBoostEncoder(), [
-                    "job_type",
-                    'category2',
-                    'client.country'
-                ]),
+                ('cat', CatBoostEncoder(), CATEGORICAL_COLUMNS),
             ], remainder='drop'
         )),
 
         ('classifier', classifier),
-    ], verbose=True)
-
-    if search:
-
-        log_space = gen_parameters_from_log_space(
-            low_value  = 0.5,
-            high_value = 5,
-            n_samples  = 10
-        )
-
-        grid = {
-            # 'union__snippet_vec__svd__n_components' : np.arange(50, 301, 50),
-            # 'union__title_vec__svd__n_components' : np.arange(100, 301, 50),
-            # 'classifier__C' : log_space,
-            # 'classifier__kernel': [
-            #     'linear',
-            #     'poly',
-            #     'rbf',
-            #     'sigmoid'
-            # ],
-            
-            # 'classifier__decision_function_shape' : [
-            #     'ovo',
-            #     'ovr'
-            # ]
-        }
-
-        # With scoring="ovo", computes the average AUC of all possible pairwise 
-        # combinations of classes. Insensitive to class imbalance when 
-        # average='macro'.
-        # Also see: https://stackoverflow.com/a/62471736/1253729
-        scorer = make_scorer(
-            score_func  = precision_score,
-            average     = "macro" 
-        )
-
-        searcher = GridSearchCV(
-            estimator          = pipeline, 
-            param_grid         = grid,
-            n_jobs             = 7, 
-            return_train_score = True, 
-            refit              = True,
-            verbose            = 1,
-            cv                 = StratifiedKFold(n_splits=3),
-            scoring            = scorer,
-        )
-
-        model = searcher.fit(X_train, y_train.values.ravel())
-
+    ], memory=memory, verbose=True)
+
+    # Each step is measured under its path in the pipeline, see estimators.py
+    name_steps(pipeline)
+
+    searcher = make_searcher(pipeline) if search else None
+    if searcher is not None:
+        # Candidates are fitted in other processes; only the search as a whole
+        # and the refit of the best candidate are measured here
+        with profiling.measure('search', 'fit'):
+            model = searcher.fit(X_train, y_train.values.ravel())
+        print(f"Best found parameters: {searcher.best_params_}")
+        for stage, value in search_timings(model).items():
+            print(f"{stage}: {round(value, 2)}")
     else:
         model = pipeline.fit(X_train, y_train.values.ravel())
-    
-    print(f"Best found parameters: {searcher.best_params_}")
 
-    return model
+    if memory is not None:
+        memory.reduce_size(bytes_limit=PIPELINE_CACHE_MB * 2**20)
+
+    return without_memory(model)
 
 
-def training_report(model, X_train, y_train, X_test, y_test, le):
+def training_report(model, F_train, y_train, F_test, y_test, le):
     """
+    Score the model on already transformed train and test features.
+
+    Args:
+        model  : Fitted pipeline or search object
+        F_train: Train features, as returned by `transform_features`
+        F_test : Test features, as returned by `transform_features`
     """
 
-    train_score = model.score(X_train, y_train)
+    classifier = final_estimator(model)[-1]
+
+    # Same score as model.score(X, y): the search's scorer, or the accuracy
+    score = getattr(model, 'scorer_', None) or (lambda clf, F, y: clf.score(F, y))
+
+    train_score = score(classifier, F_train, y_train)
     print(f"Train score: {train_score:.2f}")
     
-    test_score = model.score(X_test, y_test)
+    test_score = score(classifier, F_test, y_test)
     print(f"Test score: {test_score:.2f}")
 
-    y_pred = model.predict(X_test)
+    y_pred = classifier.predict(F_test)
     y_pred = le.inverse_transform(y_pred)
     y_test = le.inverse_transform(y_test)
     report = classification_report(y_test, y_pred, output_dict=True)
@@ -194,141 +328,210 @@ def training_report(model, X_train, y_train, X_test, y_test, le):
     return report
 
 
-def predict_unlabeled_jobs(retrain=False, n_jobs=10, window_days=2):
+# Stages of build_features when it trains a model, reported to a Stages
+TRAINING_STAGES = ['load', 'train', 'features', 'save']
+
+
+def build_features(fingerprint, stages=None, promote=True):
     """
+    Train a new model on a split of the labeled data, transform both splits
+    with it and create the performance report on the test split. The model is
+    registered as a new version with the report in its meta.json, so the
+    report always describes the data the model was evaluated on.
+
     Args:
-        n_jobs      : Number of jobs to return
-        window_days : How many days to look back for unlabeled jobs
+        fingerprint: Identifies the labeled data, see utils.data_fingerprint
+        stages     : Optional scheduler.Stages that each of TRAINING_STAGES
+                     is reported to
+        promote    : Whether to promote the new version; without it, the
+                     caller does
+
+    Returns:
+        The model, its version and the dict of features
     """
-    start = time()
-    
-    df = load_database_data()
+
+    stages = stages or Stages()
+
+    # Steps are measured in the training phase, and the measurements are
+    # stored in the new version's meta.json
+    with profiling.phase('train'), profiling.collect() as profile:
+        with stages.stage('load'):
+            X_train, X_test, y_train, y_test, le = load_labeled_data()
+
+        timings = {}
+        with stages.stage('train'):
+            train_start = time()
+            model = train(X_train, y_train)
+            timings['train_seconds'] = time() - train_start
+            timings.update(search_timings(model))
+
+        print("Creating performance report...")
+        with stages.stage('features'):
+            features_start = time()
+            features = {
+                'fingerprint'  : fingerprint,
+                'label_encoder': le,
+                'X_train'      : transform_features(model, X_train),
+                'y_train'      : y_train.values,
+                'X_test'       : transform_features(model, X_test),
+                'y_test'       : y_test.values,
+            }
+            features['report'] = training_report(
+                model,
+                features['X_train'], features['y_train'],
+                features['X_test'], features['y_test'],
+                le
+            )
+            timings['features_seconds'] = time() - features_start
+        print("Report created.")
+
+        print("Saving model...")
+        with stages.stage('save'):
+            version = registry.save_version(model, features, meta={
+                'fingerprint': fingerprint,
+                'classifier' : CLASSIFIER,
+                'n_train'    : len(y_train),
+                'n_test'     : len(y_test),
+                'classes'    : list(le.classes_),
+                'metrics'    : features['report'].to_dict(orient='index'),
+                'timings'    : timings,
+                'profile'    : profile.to_dict(),
+            })
+            if promote:
+                registry.promote(version)
+        print("Model saved.")
+
+    return model, version, features
+
+
+def retrain(stages=None):
+    """
+    Train a model on the current labels and register it, without promoting
+    it.
+
+    Returns:
+        The model, its version and the dict of features
+    """
+    return build_features(data_fingerprint(), stages, promote=False)
+
+
+def load_labeled_data():
+    """
+    Labeled jobs, collapsed to one per cluster and label if
+    COLLAPSE_DUPLICATES, with encoded labels.
+
+    Returns:
+        X_train, X_test, y_train, y_test and the fitted LabelEncoder
+    """
+
+    with profiling.measure('database', 'load_labeled'):
+        df = load_database_data()
+
+    if COLLAPSE_DUPLICATES:
+        # Near-duplicates would weigh more in training and could end up on
+        # both sides of the split. Keep the newest job of each cluster and
+        # label; jobs that weren't clustered yet have no cluster_id.
+        n_jobs = len(df)
+        clustered = df['cluster_id'].notna()
+        df = pd.concat([
+            df[clustered].drop_duplicates(subset=['cluster_id', 'label']),
+            df[~clustered]
+        ])
+        if len(df) < n_jobs:
+            print(f"Dropped {n_jobs - len(df)} near-duplicate labeled jobs.")
 
     # Encode the output labels
     le = LabelEncoder()
     le = le.fit(df.loc[:, 'label'].values.ravel())
-    df.loc[:, 'label'] = le.transform(df.loc[:, 'label'].values.ravel())
+    df['label'] = le.transform(df.loc[:, 'label'].values.ravel())
 
-    # TODO: load unlabeled data only if retrain=False
-    X_train, X_test, y_train, y_test = load_data(df)
+    return (*load_data(df), le)
 
-    unlabeled = load_unlabeled_data()
 
-    if Path(MODEL_FILENAME).exists() and not retrain:
-        print("Loading model...")
-        model = pickle.load(open(MODEL_FILENAME, 'rb'))
-        print("Model loaded.")
-    else:
+def load_batch_predictions(retrain, since, n_jobs, collapse):
+    """
+    Report of the served model of the registry, the best unlabeled jobs of
+    each class it predicted since `since`, see predict_unlabeled_jobs, and
+    its classes.
+    """
 
-        # TODO: create the report here and save it, do not recreate it when 
-        # loading data bacause it seems that the data used for the evaluation 
-        # may be part of training
-        model = train(X_train, y_train)
-        print("Saving model...")
-        pickle.dump(model, open(MODEL_FILENAME, 'wb'))
-        print("Model saved.")
-    
-    print("Creating performance report...")
-    report = training_report(model, X_train, y_train, X_test, y_test, le)
-    print("Report created.")
+    version = None if retrain else registry.current_version()
+    if version is None:
+        model, version, features = build_features(data_fingerprint())
+
+    # The report of the model's own test split, saved when it was trained.
+    # Labels added since are only evaluated by the next training.
+    report = registry.load_report(version)
+
+    # Jobs downloaded since the model was last promoted weren't scored yet
+    score_jobs(version, since=since)
+
+    # The best scored unlabeled jobs of each class in the window, with their
+    # stored predictions. Jobs predicted as Bad are only shown when the model
+    # isn't confident about them.
+    unlabeled = load_scored_jobs(
+        version, since,
+        n_per_class = n_jobs,
+        collapse    = collapse,
+        max_scores  = {'Bad': MAX_BAD_SCORE}
+    )
+    return report, unlabeled, registry.load_classes(version)
+
+
+def select_jobs(unlabeled, n_jobs, classes):
+    """
+    Good ones first, then Maybe, then Bad, then any other class, each by
+    decreasing score.
+
+    Args:
+        classes: Classes of the model, whose scores are columns of `unlabeled`
+
+    Returns:
+        List of dicts with the fields shown by /predict
+    """
+
+    rows = scoring.select(
+        unlabeled['predicted'].values, unlabeled['score'].values, n_jobs, SELECTION_ORDER)
+    return scoring.records(unlabeled, rows, classes)
+
+
+def predict_unlabeled_jobs(retrain=False, n_jobs=10, window_days=2, collapse=None):
+    """
+    Args:
+        n_jobs      : Number of jobs to return
+        window_days : How many days to look back for unlabeled jobs
+        collapse    : Return only the newest job of each cluster of
+                      near-duplicates. By default, COLLAPSE_DUPLICATES.
+    """
+    start = time()
+    collapse = COLLAPSE_DUPLICATES if collapse is None else collapse
 
     now = datetime.now(tz=pytz.timezone('America/Lima'))
-    window = timedelta(days=window_days)
-    
-    # Filter by date some jobs
-    unlabeled = unlabeled.loc[unlabeled['date_created'] >= now - window, :]
+    since = int((now - timedelta(days=window_days)).timestamp())
+
+    if MODEL_BACKEND == 'online':
+        # Predicted on the fly by the model that learned every label so far
+        report = online.learner.report()
+        classes = LABELS
+        unlabeled = online.load_predicted_jobs(
+            since,
+            n_per_class = n_jobs,
+            collapse    = collapse,
+            max_scores  = {'Bad': MAX_BAD_SCORE}
+        )
+    else:
+        report, unlabeled, classes = load_batch_predictions(retrain, since, n_jobs, collapse)
 
     if unlabeled.shape[0] == 0:
-        return []
-    
-    # Predict a class
-    predicted_class = model.predict(unlabeled)
-    predicted_class = le.inverse_transform(predicted_class)
-
-    # Calculate SVM probabilities?
-    #
-    # After researching, it looks like there is no simple way of obtaining 
-    # probabilities out of SVM because it's not a probabilistic model, as 
-    # mentioned in [1], which is a post linked by the documentation of 
-    # `decision_function` in [2].
-    # Similarly, in [3, p.4] is said that the mapping from decision functions 
-    # to probabilities via softmax "is not very well founded, as the scaled 
-    # values are not justified fro the data".
-    # 
-    # The following comes from the documentation:
-    # The decision_function method of SVC gives per-class scores for each 
-    # sample.
-    # - If decision_function_shape=’ovo’, the function values are proportional 
-    #   to the distance of the samples X to the separating hyperplane. If the 
-    #   exact distances are required, divide the function values by the norm of
-    #   the weight vector (coef_). 
-    # - If decision_function_shape=’ovr’, the decision function is a monotonic 
-    #   transformation of ovo decision function.
-    #
-    # [1] https://stats.stackexchange.com/a/14881/55820
-    # [2] https://scikit-learn.org/stable/modules/generated/sklearn.svm.SVC.html#sklearn.svm.SVC.decision_function
-    # [3] https://www.econstor.eu/bitstream/10419/22569/1/tr56-04.pdf
-    dist_to_hyperplanes = np.array(model.decision_function(unlabeled))
-    pseudo_probs = np.exp(dist_to_hyperplanes) / np.sum(np.exp(dist_to_hyperplanes), axis=1).reshape(-1,1) # softmax after the voting
-
-    # Weights assigned to the features (coefficients in the primal problem)
-    # weights = model.best_estimator_.named_steps['classifier'].coef_
-    
-    print(f"Predicted class: {predicted_class}")
-    print(f"Distances to hyperplanes: {dist_to_hyperplanes}")
-    print(f"My pseudo-probability: {pseudo_probs}")
-    
-    assignments = {
-        "predicted"    : predicted_class,
-        "score"        : pseudo_probs.max(axis=1),
-        le.classes_[0] : pseudo_probs[:,0], # e.g. "Good" or "Bad" or "Maybe"
-        le.classes_[1] : pseudo_probs[:,1],
-        le.classes_[2] : pseudo_probs[:,2]
-    }
+        return [], report
 
-    # Add columns with new information
-    unlabeled = unlabeled.assign(**assignments)
-    unlabeled.sort_values(by=['score'], inplace=True, ascending=False)
-
-    unlabeled_good  = unlabeled.loc[unlabeled.predicted == "Good", :].copy()
-    unlabeled_maybe = unlabeled.loc[unlabeled.predicted == "Maybe", :].copy()
-    unlabeled_bad   = unlabeled.loc[unlabeled.predicted == "Bad", :].copy()
-
-    selected_jobs = []
-    n_collected = 0
-    for type_df, df in [("Good", unlabeled_good), ("Maybe",  unlabeled_maybe), ("Bad", unlabeled_bad)]:
-        for i,row in df.iterrows():
-            
-            if n_collected == n_jobs:
-                break
-
-            if not (now < row['date_created'] + window):
-                continue
-
-            if type_df == "Good":
-                selected_jobs.append(row)
-                n_collected += 1
-
-            elif type_df == "Maybe":
-                selected_jobs.append(row)
-                n_collected += 1
-            
-            elif type_df == "Bad":
-                if row["score"] < 0.3:
-                    selected_jobs.append(row)
-                    n_collected += 1
+    selected_jobs = select_jobs(unlabeled, n_jobs, classes)
 
     end = time()
     print(f"Prediction took {end - start:.1f} seconds.")
     return selected_jobs, report
 
 
-def load_unlabeled_data():
-    unlabeled = load_database_data(['Uncategorized'])
-    unlabeled.date_created = pd.to_datetime(unlabeled.date_created)
-    unlabeled.drop(['label'], axis=1, inplace=True)
-    return unlabeled
-
 def load_data(df, labeled=True):
     y = df.loc[:, 'label']
     X = df.drop(['label'], axis=1)
@@ -0,0 +1,330 @@
+"""
+Online model, updated with every label.
+
+Its features need no fitting: the tokens of the title and snippet are hashed
+into fixed-size vectors (HashingVectorizer), as are the categories
+(FeatureHasher), and the numbers are log-scaled. The classifier is a linear
+SGDClassifier, so a new label is learned with one `partial_fit` on a single
+job, in milliseconds, and the next /predict already ranks with it.
+
+A partial fit can't forget what was learned from a label that is later
+changed, and the order of the updates matters. The model is rebuilt from all
+the labeled jobs periodically, and the agreement between the incremental
+model and the rebuilt one is logged as a consistency check.
+
+The model is saved in MODELS_DIR/online.joblib, outside the versioned
+registry, since it changes with every label. When there is no saved model,
+e.g. right after upgrading, it's built by the background `rebuilder`, and
+labels received meanwhile are only learned from the database by that build.
+"""
+
+# Built-in imports
+import threading
+from time import time
+from pathlib import Path
+from collections import deque
+
+# External imports
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import FunctionTransformer
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import classification_report
+
+# Local imports
+from src import config
+from src import registry
+from src import scoring
+from src.scheduler import BackgroundWorker
+from src.preprocessors import SpacyPreprocessor
+from src.preprocessors import identity
+from src.predictions import predict_scores
+from src import db
+from src.utils import iter_jobs
+from src.utils import concat_chunks
+from src.utils import load_database_data
+from src.utils import MODEL_COLUMNS
+
+
+def log_numbers(X):
+    """ log(1 + x) of the numeric columns, with missing values as 0 """
+    return np.log1p(np.clip(np.nan_to_num(np.asarray(X, dtype=float)), 0, None))
+
+
+def category_tokens(X):
+    """ One "column=value" string per categorical column of each row """
+    X = pd.DataFrame(X).astype(object)
+    return [
+        [f"{column}={value}" for column, value in zip(X.columns, row) if value is not None]
+        for row in X.itertuples(index=False)
+    ]
+
+
+def text_features():
+    return Pipeline([
+        ('preprocessor', SpacyPreprocessor()),
+        ('hashing', HashingVectorizer(
+            n_features     = 2 ** config.ONLINE_HASH_BITS,
+            tokenizer      = identity,
+            preprocessor   = None,
+            lowercase      = False,
+            token_pattern  = None,
+            ngram_range    = (1,2),
+            alternate_sign = False
+        )),
+    ])
+
+
+def build_model():
+    """ Unfitted online pipeline: stateless features and a linear classifier """
+
+    features = ColumnTransformer([
+        ('numbers', FunctionTransformer(log_numbers), config.NUMERIC_COLUMNS),
+        ('title', text_features(), 'title'),
+        ('snippet', text_features(), 'snippet'),
+        ('categories', Pipeline([
+            ('tokens', FunctionTransformer(category_tokens)),
+            ('hashing', FeatureHasher(
+                n_features     = 2 ** 10,
+                input_type     = 'string',
+                alternate_sign = False
+            )),
+        ]), config.CATEGORICAL_COLUMNS),
+    ], remainder='drop')
+
+    classifier = SGDClassifier(
+        loss         = 'hinge', # A linear SVM, like the batch model
+        alpha        = config.ONLINE_ALPHA,
+        random_state = 42
+    )
+
+    return Pipeline([('features', features), ('classifier', classifier)])
+
+
+def encode(labels):
+    """ Label names as the indices of config.LABELS, like a LabelEncoder """
+    return np.searchsorted(config.LABELS, labels)
+
+
+class OnlineLearner:
+    """
+    Thread-safe holder of the online model, loaded on first use.
+    """
+    def __init__(self, path=None):
+        self.custom_path = path
+        self.lock        = threading.RLock()
+        self.state       = None
+
+    @property
+    def path(self):
+        return Path(self.custom_path or Path(config.MODELS_DIR) / 'online.joblib')
+
+    def get_state(self):
+        """
+        The model and its statistics, or None if it isn't built yet. Building
+        it takes spaCy over every labeled job, so it's queued to the
+        background rebuilder instead of holding up the caller.
+        """
+        with self.lock:
+            if self.state is None:
+                if self.path.exists():
+                    self.state = joblib.load(self.path)
+                else:
+                    rebuilder.submit()
+            return self.state
+
+    def save(self):
+        with self.lock:
+            registry.models_dir()
+            registry.atomic_write(self.path, lambda tmp: joblib.dump(self.state, tmp))
+
+    def rebuild(self, progress=None):
+        """
+        Fit a new model on all the labeled jobs, with ONLINE_EPOCHS shuffled
+        passes, and serve it instead of the incremental one.
+
+        Args:
+            progress: Optional scheduler.Run that gets the number of jobs and
+                      the agreement with the previous model
+        """
+
+        start = time()
+        df = load_database_data()
+        df = df[df['label'].isin(config.LABELS)]
+        if df.empty:
+            print("No labeled jobs to fit the online model on.")
+            return None
+
+        model = build_model()
+        features = model[:-1].fit_transform(df)
+        y = encode(df['label'].values)
+
+        rng = np.random.RandomState(42)
+        classes = np.arange(len(config.LABELS))
+        for _ in range(config.ONLINE_EPOCHS):
+            order = rng.permutation(len(y))
+            model[-1].partial_fit(features[order], y[order], classes=classes)
+
+        with self.lock:
+            previous = self.state
+            agreement = None
+            if previous is not None:
+                # How far the incremental model drifted from a full refit
+                old = previous['model'][-1].predict(previous['model'][:-1].transform(df))
+                agreement = float(np.mean(old == model[-1].predict(features)))
+                print(f"Online model agreement with a full refit: {agreement:.1%}")
+
+            self.state = {
+                'model'    : model,
+                'n_labels' : len(y),
+                'n_updates': 0,
+                'history'  : deque(maxlen=config.ONLINE_HISTORY),
+                'rebuilt'  : time(),
+                'agreement': agreement,
+            }
+            self.save()
+
+        print(f"Online model fitted on {len(y)} jobs in {time() - start:.1f} seconds.")
+        if progress is not None:
+            progress.set('n_labels', len(y))
+            progress.set('agreement', agreement)
+        return self.state
+
+    def learn(self, job_id, label):
+        """
+        Update the model with the label of a job. Before learning from it, the
+        model's prediction for the job is recorded, to measure its accuracy on
+        labels it hasn't seen (see `report`).
+
+        Returns:
+            Seconds it took, or None if the label isn't a class
+        """
+
+        if label not in config.LABELS:
+            return None
+
+        start = time()
+        jobs = next(iter_jobs("id = ?", [job_id]), None)
+        if jobs is None:
+            return None
+
+        with self.lock:
+            state = self.get_state()
+            if state is None:
+                return None
+            model = state['model']
+            features = model[:-1].transform(jobs)
+            y = encode([label])
+            state['history'].append((int(y[0]), int(model[-1].predict(features)[0])))
+            model[-1].partial_fit(features, y)
+            state['n_updates'] += 1
+            if state['n_updates'] % config.ONLINE_SAVE_EVERY == 0:
+                self.save()
+
+        return time() - start
+
+    def predict(self, X):
+        """
+        Predicted classes and pseudo-probabilities, see predict_scores, or
+        None if there is no model because nothing is labeled yet.
+        """
+        with self.lock:
+            state = self.get_state()
+            return None if state is None else predict_scores(state['model'], X)
+
+    def report(self):
+        """
+        Classification report of the predictions made right before learning
+        from each of the last ONLINE_HISTORY labels.
+        """
+
+        state = self.get_state()
+        if state is None or not state['history']:
+            return pd.DataFrame()
+
+        y_true, y_pred = zip(*state['history'])
+        report = classification_report(
+            np.array(config.LABELS)[list(y_true)],
+            np.array(config.LABELS)[list(y_pred)],
+            output_dict=True, zero_division=0
+        )
+        return pd.DataFrame(report).round(2).T
+
+
+# Shared by the routes and the background rebuild
+learner = OnlineLearner()
+
+# The model is rebuilt from all the labels every ONLINE_REBUILD_HOURS, which
+# also measures how far the label-by-label updates drifted, and when there is
+# none yet
+rebuilder = BackgroundWorker(
+    'online-rebuild',
+    learner.rebuild,
+    interval = config.ONLINE_REBUILD_HOURS * 3600
+)
+
+
+def load_predicted_jobs(since, n_per_class=None, collapse=False, max_scores=None):
+    """
+    Unlabeled jobs created since `since` with the predictions of the online
+    model, in the same shape as predictions.load_scored_jobs. Predictions
+    aren't stored since the model changes with every label; only the model's
+    columns of the window are read to predict, and the full rows of the
+    selected jobs afterwards.
+
+    Args:
+        since      : Seconds since the epoch
+        n_per_class: Keep the best scored jobs of each predicted class
+        collapse   : Only consider the newest job of each cluster of
+                     near-duplicates
+        max_scores : Dict of class -> score; jobs of that class are only kept
+                     if their score is below it
+    """
+
+    columns = ['id', 'created_epoch', 'cluster_id'] + MODEL_COLUMNS
+    jobs = concat_chunks(iter_jobs(
+        "label = 'Uncategorized' AND created_epoch >= ? ORDER BY created_epoch DESC, id DESC",
+        [since], columns
+    ), columns)
+    if jobs.empty:
+        return pd.DataFrame()
+
+    if collapse:
+        jobs = jobs[~jobs['cluster_id'].fillna(jobs['id']).duplicated()]
+
+    prediction = learner.predict(jobs)
+    if prediction is None:
+        return pd.DataFrame()
+
+    predicted_class, pseudo_probs = prediction
+    predicted = np.array(config.LABELS)[predicted_class]
+    score = pseudo_probs.max(axis=1)
+
+    keep = np.ones(len(jobs), dtype=bool)
+    for label, max_score in (max_scores or {}).items():
+        keep &= ~((predicted == label) & (score >= max_score))
+    keep = np.flatnonzero(keep)
+    rows = keep[scoring.top_n_per_class(predicted[keep], score[keep], n_per_class)]
+
+    scores = pd.DataFrame(pseudo_probs[rows], columns=config.LABELS)
+    scores['predicted'] = predicted[rows]
+    scores['score'] = score[rows]
+    scores['id'] = jobs['id'].values[rows]
+
+    ids = scores['id'].tolist()
+    with db.read() as conn:
+        selected = pd.read_sql_query(
+            f"SELECT * FROM {config.TABLE_NAME} WHERE id IN ({','.join('?' * len(ids))})",
+            conn, params=ids
+        )
+
+    # Stored predictions are the batch model's
+    selected = selected.drop(['label', 'predicted_label', 'score', 'scores', 'model_version',
+                              'margin', 'entropy'], axis=1)
+    selected['date_created'] = pd.to_datetime(selected['date_created'])
+    return selected.merge(scores, on='id')
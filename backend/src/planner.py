@@ -0,0 +1,159 @@
+"""
+Search-term planner.
+
+Every search term costs at least one rate-limited API call per download. Using
+the job-term matches recorded by `add_records`, the planner measures how many
+jobs each term finds, how many only that term finds, and how much it overlaps
+with the others, and picks a smaller set of terms that still finds every job
+seen in the last PLANNER_HISTORY_DAYS days.
+
+Print a report with:
+
+    python -m src.planner
+"""
+
+# Built-in imports
+import sqlite3 as sql
+from datetime import datetime, timedelta, timezone
+
+# External imports
+import pandas as pd
+
+# Local imports
+from src import db
+from src import config
+
+
+def load_term_hits(conn, days=None):
+    """
+    Load which terms matched each job posted in the last `days` days.
+
+    Returns:
+        Dict of term -> set of job ids
+    """
+
+    days = config.PLANNER_HISTORY_DAYS if days is None else days
+    since = (datetime.now(tz=timezone.utc) - timedelta(days=days)).isoformat()
+    rows = conn.execute(f"""
+        SELECT t.term, t.job_id
+        FROM {config.JOB_TERMS_TABLE} t
+        JOIN {config.TABLE_NAME} j ON j.id = t.job_id
+        WHERE j.date_created >= ?""", (since,)).fetchall()
+
+    hits = {}
+    for term, job_id in rows:
+        hits.setdefault(term, set()).add(job_id)
+    return hits
+
+
+def plan_terms(terms, hits):
+    """
+    Choose the terms to search with a greedy set cover: repeatedly keep the
+    term that finds the most jobs not found by the terms kept so far, until
+    every job is covered.
+
+    Terms without any recorded hit are always kept. That includes terms that
+    were pruned by a previous plan once their history leaves the window, so a
+    pruned term is searched again from time to time and its redundancy is
+    checked against fresh data.
+
+    Args:
+        terms: Configured search terms, in order of preference
+        hits : Dict of term -> set of job ids, as from `load_term_hits`
+
+    Returns:
+        List of terms to search, in the same order as `terms`
+    """
+
+    candidates = {term: hits[term] for term in terms if hits.get(term)}
+    uncovered = set().union(*candidates.values())
+
+    kept = {term for term in terms if not hits.get(term)}
+    while uncovered:
+        # Ties go to the term listed first in the configuration
+        best = max(candidates, key=lambda t: (len(candidates[t] & uncovered), -terms.index(t)))
+        kept.add(best)
+        uncovered -= candidates.pop(best)
+
+    return [term for term in terms if term in kept]
+
+
+def term_report(terms, hits, planned):
+    """
+    Per-term yield and overlap statistics.
+
+    Returns:
+        DataFrame indexed by term with the columns:
+        - hits   : jobs the term found
+        - unique : jobs only this term found
+        - overlap: largest share of the term's jobs also found by another term
+        - with   : that other term
+        - keep   : whether the plan keeps the term
+    """
+
+    rows = []
+    for term in terms:
+        jobs = hits.get(term, set())
+        others = set().union(*(hits.get(t, set()) for t in terms if t != term))
+
+        overlap, overlap_with = 0.0, ''
+        for other in terms:
+            if other == term or not jobs:
+                continue
+            shared = len(jobs & hits.get(other, set())) / len(jobs)
+            if shared > overlap:
+                overlap, overlap_with = shared, other
+
+        rows.append({
+            'term'   : term,
+            'hits'   : len(jobs),
+            'unique' : len(jobs - others),
+            'overlap': round(overlap, 2),
+            'with'   : overlap_with,
+            'keep'   : term in planned,
+        })
+
+    return pd.DataFrame(rows).set_index('term')
+
+
+def active_search_terms(terms=None, database=None):
+    """
+    Terms to use in a download. The configured terms unless
+    AUTO_PRUNE_SEARCH_TERMS is enabled and there is enough history to plan.
+    """
+
+    terms = list(config.SEARCH_TERMS if terms is None else terms)
+    if not config.AUTO_PRUNE_SEARCH_TERMS:
+        return terms
+
+    try:
+        with db.read(database) as conn:
+            hits = load_term_hits(conn)
+    except sql.Error as e:
+        print(f"Couldn't plan the search terms: {e}")
+        return terms
+
+    if len(set().union(*hits.values())) < config.PLANNER_MIN_JOBS:
+        return terms
+
+    planned = plan_terms(terms, hits)
+    print(f"Searching {len(planned)} of {len(terms)} terms")
+    return planned
+
+
+if __name__ == "__main__":
+    with db.read() as conn:
+        hits = load_term_hits(conn)
+
+    terms = list(config.SEARCH_TERMS)
+    planned = plan_terms(terms, hits)
+    print(term_report(terms, hits, planned).to_string())
+
+    n_jobs = len(set().union(*hits.values()))
+    saved = len(terms) - len(planned)
+    print(f"\n{n_jobs} jobs found in the last {config.PLANNER_HISTORY_DAYS} days.")
+    print(f"{len(planned)} of {len(terms)} terms find all of them: "
+          f"{saved} fewer API calls per refresh ({saved / max(len(terms), 1):.0%}).")
+    print(f"Pruned terms: {', '.join(t for t in terms if t not in planned) or 'none'}")
+    if not config.AUTO_PRUNE_SEARCH_TERMS:
+        print("Set AUTO_PRUNE_SEARCH_TERMS = True in config.py to apply this plan.")
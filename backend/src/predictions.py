@@ -0,0 +1,215 @@
+"""
+Predictions stored in the jobs table.
+
+Unlabeled jobs are scored with the served model right after they are
+downloaded, and the predicted label, the score of each class and the model
+version are written next to them. Jobs only need to be scored again when the
+served model version changes.
+
+Scoring is serialized by `scoring_lock`, so a request, a download and a
+training never score the same jobs at once.
+"""
+
+# Built-in imports
+import json
+import threading
+
+# External imports
+import pandas as pd
+
+# Local imports
+from src import db
+from src import config
+from src import registry
+from src import scoring
+from src import profiling
+from src.utils import iter_jobs
+from src.utils import MODEL_COLUMNS
+
+
+def final_estimator(model):
+    """ The fitted pipeline, whether `model` is a search object or a pipeline """
+    return getattr(model, 'best_estimator_', model)
+
+
+def transform_features(model, X):
+    """ Run data through every step of the fitted pipeline but the classifier """
+    return final_estimator(model)[:-1].transform(X)
+
+
+def predict_scores(model, X):
+    """
+    Predict the class of each row of X and a pseudo-probability per class.
+
+    Returns:
+        Encoded predicted classes, and an array of shape (n_rows, n_classes)
+    """
+
+    # One pass over the jobs: the predicted class is the one with the largest
+    # one-vs-rest decision value, which is what `predict` returns for the
+    # linear classifiers and for SVC with decision_function_shape='ovr'
+    features = transform_features(model, X)
+    classifier = final_estimator(model)[-1]
+
+    # Calculate SVM probabilities?
+    #
+    # After researching, it looks like there is no simple way of obtaining
+    # probabilities out of SVM because it's not a probabilistic model, as
+    # mentioned in [1], which is a post linked by the documentation of
+    # `decision_function` in [2].
+    # Similarly, in [3, p.4] is said that the mapping from decision functions
+    # to probabilities via softmax "is not very well founded, as the scaled
+    # values are not justified fro the data".
+    #
+    # The following comes from the documentation:
+    # The decision_function method of SVC gives per-class scores for each
+    # sample.
+    # - If decision_function_shape=’ovo’, the function values are proportional
+    #   to the distance of the samples X to the separating hyperplane. If the
+    #   exact distances are required, divide the function values by the norm of
+    #   the weight vector (coef_).
+    # - If decision_function_shape=’ovr’, the decision function is a monotonic
+    #   transformation of ovo decision function.
+    #
+    # [1] https://stats.stackexchange.com/a/14881/55820
+    # [2] https://scikit-learn.org/stable/modules/generated/sklearn.svm.SVC.html#sklearn.svm.SVC.decision_function
+    # [3] https://www.econstor.eu/bitstream/10419/22569/1/tr56-04.pdf
+    dist_to_hyperplanes = scoring.decision_matrix(classifier.decision_function(features))
+    predicted_class = classifier.classes_[dist_to_hyperplanes.argmax(axis=1)]
+    pseudo_probs = scoring.softmax(dist_to_hyperplanes) # softmax after the voting
+
+    # Weights assigned to the features (coefficients in the primal problem)
+    # weights = model.best_estimator_.named_steps['classifier'].coef_
+
+    return predicted_class, pseudo_probs
+
+
+# Held while scoring, see score_jobs
+scoring_lock = threading.Lock()
+
+
+def score_jobs(version=None, since=None, chunk_size=1000):
+    """
+    Score the unlabeled jobs that weren't scored by `version` yet and store the
+    predictions.
+
+    Args:
+        version   : Model version, by default the served one
+        since     : Only score jobs created since this many seconds since the epoch
+        chunk_size: Jobs scored at a time
+
+    Returns:
+        Number of scored jobs, 0 if `version` isn't the served one
+    """
+
+    with scoring_lock:
+        version = version or registry.current_version()
+        if version is None or version != registry.current_version():
+            # A caller that read the served version before a new one was
+            # promoted, and waited for its scoring here, would score the jobs
+            # back with the old one
+            return 0
+
+        classes = registry.load_classes(version)
+        if classes is None:
+            print(f"Model {version} has no classes recorded, not scoring.")
+            return 0
+
+        # Jobs scored before the uncertainty was stored are scored again
+        where = "label = 'Uncategorized' AND (model_version IS NOT ? OR margin IS NULL)"
+        params = [version]
+        if since is not None:
+            where += " AND created_epoch >= ?"
+            params.append(since)
+
+        update_sql = f"""
+            UPDATE {config.TABLE_NAME}
+            SET predicted_label = ?, score = ?, scores = ?, model_version = ?,
+                margin = ?, entropy = ?
+            WHERE id = ?"""
+
+        # Jobs are read in chunks of only the model's columns. The writer is
+        # only held to store each chunk, not while predicting.
+        model = None
+        n_scored = 0
+        chunks = iter_jobs(where, params, ['id'] + MODEL_COLUMNS, chunk_size)
+        for jobs in profiling.measure_chunks(chunks, 'database', 'load_unscored'):
+            model = model or registry.load_model(version)
+            predicted_class, pseudo_probs = predict_scores(model, jobs)
+            margins, entropies = scoring.uncertainty(pseudo_probs)
+            with profiling.measure('database', 'store_scores'), db.write() as conn:
+                conn.executemany(update_sql, [
+                    (
+                        classes[predicted],
+                        float(probs.max()),
+                        json.dumps(dict(zip(classes, probs.round(4).tolist()))),
+                        version,
+                        float(margin),
+                        float(entropy),
+                        job_id
+                    )
+                    for job_id, predicted, probs, margin, entropy in zip(
+                        jobs['id'], predicted_class, pseudo_probs, margins, entropies)
+                ])
+            n_scored += len(jobs)
+
+        if n_scored == 0:
+            return 0
+
+        print(f"Scored {n_scored} jobs with model {version}.")
+        return n_scored
+
+
+def load_scored_jobs(version, since, n_per_class=None, collapse=False, max_scores=None):
+    """
+    Unlabeled jobs created since `since` with the predictions of model
+    `version`, one column per class score. The window, the collapsing and the
+    per-class selection run in one query over the (label, created_epoch)
+    index, so only the jobs of the window are read and only the selected
+    ones are returned.
+
+    Args:
+        since      : Seconds since the epoch
+        n_per_class: Keep the best scored jobs of each predicted class
+        collapse   : Only consider the newest job of each cluster of
+                     near-duplicates
+        max_scores : Dict of class -> score; jobs of that class are only kept
+                     if their score is below it
+    """
+
+    max_scores = max_scores or {}
+    class_filter = ' '.join("AND NOT (predicted_label = ? AND score >= ?)" for _ in max_scores)
+
+    query = f"""
+        WITH windowed AS (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY COALESCE(cluster_id, id)
+                ORDER BY created_epoch DESC, id DESC
+            ) AS cluster_rank
+            FROM {config.TABLE_NAME}
+            WHERE label = 'Uncategorized' AND created_epoch >= ? AND model_version = ?
+        ),
+        ranked AS (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY predicted_label ORDER BY score DESC
+            ) AS class_rank
+            FROM windowed
+            WHERE (cluster_rank = 1 OR NOT ?) {class_filter}
+        )
+        SELECT * FROM ranked
+        WHERE ? IS NULL OR class_rank <= ?
+        ORDER BY predicted_label, class_rank"""
+    params = [
+        since, version, collapse,
+        *(value for item in max_scores.items() for value in item),
+        n_per_class, n_per_class,
+    ]
+
+    with profiling.measure('database', 'load_scored'), db.read() as conn:
+        jobs = pd.read_sql_query(query, conn, params=params)
+
+    scores = pd.DataFrame([json.loads(s) for s in jobs['scores']], index=jobs.index)
+    jobs = jobs.drop(['label', 'scores', 'cluster_rank', 'class_rank'], axis=1)
+    jobs = jobs.rename(columns={'predicted_label': 'predicted'})
+    jobs['date_created'] = pd.to_datetime(jobs['date_created'])
+    return pd.concat([jobs, scores], axis=1)
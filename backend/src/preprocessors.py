@@ -1,11 +1,26 @@
 # Built-in imports
 import string
+import multiprocessing
 
 # External imports
 from sklearn.base import BaseEstimator, TransformerMixin
 import spacy
 from spacy.lang.en import English
 from spacy.lang.en.stop_words import STOP_WORDS
+from spacy.attrs import ORTH
+
+# Local imports
+from src.token_cache import TokenCache
+from src.token_cache import cache_version
+
+
+# Marks the words that weren't looked up yet
+MISSING = object()
+
+
+def identity(arg):
+    """ Simple identity function used in TfidfVEctorizer as passthrough"""
+    return arg
 
 
 class SpacyPreprocessor(BaseEstimator, TransformerMixin):
@@ -14,11 +29,50 @@ class SpacyPreprocessor(BaseEstimator, TransformerMixin):
     - lemmatization
     - stop words removal (this is also handled by tfidf)
     - 
+
+    With use_cache=True, the tokens of each document are looked up in a
+    persistent TokenCache before running spaCy, so every document is only
+    tokenized once across fits, CV folds and predictions.
+
+    Documents are tokenized in batches of `batch_size`, in `n_process`
+    processes when it's greater than 1. With fast_path=True, the lemma and the
+    stop-word and punctuation flags are only read from a Token object the first
+    time a word is seen in a call: with a tokenizer-only pipeline they depend on
+    the word alone, so later occurrences are resolved from the word's id.
+
+    The spaCy tokenizer is only created when a document has to be tokenized,
+    and isn't pickled: cloning the preprocessor, e.g. for each candidate of a
+    hyperparameter search, or loading it from a cache is then cheap.
     """
-    def __init__(self):
-        self.nlp       = English()
-        self.tokenizer = self.nlp.Defaults.create_tokenizer(self.nlp)
-        self.stopwords = STOP_WORDS
+    def __init__(self, use_cache=True, batch_size=1000, n_process=1, fast_path=True):
+        self.use_cache  = use_cache
+        self.batch_size = batch_size
+        self.n_process  = n_process
+        self.fast_path  = fast_path
+        self.stopwords  = STOP_WORDS
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('spacy_tokenizer', None)
+        return state
+
+    def __setstate__(self, state):
+        # Models pickled before the cache and batching existed
+        state.setdefault('use_cache', True)
+        state.setdefault('batch_size', 1000)
+        state.setdefault('n_process', 1)
+        state.setdefault('fast_path', True)
+        state.pop('nlp', None) # Pickled with the models before it was lazy
+        state.pop('tokenizer', None)
+        super().__setstate__(state)
+
+    @property
+    def tokenizer(self):
+        """ spaCy's English tokenizer, created on first use """
+        if 'spacy_tokenizer' not in self.__dict__:
+            nlp = English()
+            self.spacy_tokenizer = nlp.Defaults.create_tokenizer(nlp)
+        return self.spacy_tokenizer
 
     def fit(self, X, y=None):
         """
@@ -30,15 +84,90 @@ class SpacyPreprocessor(BaseEstimator, TransformerMixin):
         """
         Actually runs the preprocessing on each document.
         """
-        return [
-            list(self.tokenize(doc)) for doc in X
-        ]
+        if not self.use_cache:
+            return self.tokenize_many(X)
+
+        cache = self.token_cache()
+        keys = [cache.key(doc) for doc in X]
+        tokens = cache.get_many(set(keys))
+
+        missing = {}
+        for key, doc in zip(keys, X):
+            if key not in tokens:
+                missing[key] = doc
+        if missing:
+            missing = dict(zip(missing, self.tokenize_many(missing.values())))
+            cache.put_many(missing)
+            tokens.update(missing)
+
+        return [list(tokens[key]) for key in keys]
+
+    def tokenize_many(self, documents):
+        """
+        Tokenize a stream of documents in batches, like `tokenize` does with
+        a single one.
+        """
+        documents = [str(doc) for doc in documents]
+        if self.n_process > 1 and len(documents) > self.batch_size:
+            # Workers send back lists of strings, which are much cheaper to
+            # pickle than the Doc objects that nlp.pipe(n_process=...) returns
+            batches = [
+                documents[i:i + self.batch_size]
+                for i in range(0, len(documents), self.batch_size)
+            ]
+            params = self.get_params()
+            params.update(use_cache=False, n_process=1)
+            with multiprocessing.Pool(self.n_process) as pool:
+                results = pool.map(tokenize_batch, [(params, batch) for batch in batches])
+            return [tokens for batch in results for tokens in batch]
+
+        docs = self.tokenizer.pipe(documents, batch_size=self.batch_size)
+
+        if not self.fast_path:
+            return [
+                [tk.lemma_ for tk in doc if not (tk.is_stop or tk.is_punct)]
+                for doc in docs
+            ]
+
+        # Word id -> lemma, or None for stop words and punctuation. Kept for
+        # this call only, so it doesn't grow with every word ever seen
+        lemmas = {}
+        token_lists = []
+        for doc in docs:
+            token_list = []
+            for i, orth in enumerate(doc.to_array(ORTH).tolist()):
+                lemma = lemmas.get(orth, MISSING)
+                if lemma is MISSING:
+                    tk = doc[i]
+                    lemma = lemmas[orth] = None if (tk.is_stop or tk.is_punct) else tk.lemma_
+                if lemma is not None:
+                    token_list.append(lemma)
+            token_lists.append(token_list)
+        return token_lists
+
+    def token_cache(self):
+        """ Cache for the tokens produced with this spaCy version and stop words """
+        version = cache_version(spacy.__version__, ' '.join(sorted(self.stopwords)))
+        return TokenCache(version)
 
     def tokenize(self, document):
         """
-        Tokenize a document by lemmatization while removing stop words and 
+        Tokenize a document by lemmatization while removing stop words and
         punctuation.
         """
         tokens = self.tokenizer(document)
         token_list = [tk.lemma_ for tk in tokens if not (tk.is_stop or tk.is_punct)]
-        return token_list
\ No newline at end of file
+        return token_list
+
+
+def tokenize_batch(args):
+    """ Worker of SpacyPreprocessor.tokenize_many in multi-process mode """
+    global _worker_preprocessor
+    params, documents = args
+    if _worker_preprocessor is None or _worker_preprocessor.get_params() != params:
+        _worker_preprocessor = SpacyPreprocessor(**params)
+    return _worker_preprocessor.tokenize_many(documents)
+
+
+# One preprocessor per worker process, reused across batches
+_worker_preprocessor = None
@@ -0,0 +1,228 @@
+"""
+Wall time, CPU time and peak memory of the steps of the learning pipeline.
+
+A step is measured with `measure`, either directly, e.g. loading jobs from the
+database, or by the estimators of estimators.py, which measure their own fit,
+transform and predict calls. Each measurement is added to the totals of the
+process, served in the Prometheus text format by /metrics, and to the
+Profiles being collected in the same thread, like the one stored in the
+meta.json of each trained version.
+
+- Wall time: time.perf_counter.
+- CPU time: time.process_time, of the whole process, so it includes the
+  threads of BLAS and those of a request served during a training.
+- Peak memory: the most memory allocated through Python during the step,
+  above what was allocated when it started, traced with tracemalloc when
+  PROFILE_MEMORY. It's also of the whole process. Python 3.8 can't reset
+  tracemalloc's peak, so there a step's peak is only known when it raised
+  the peak of the process; otherwise the memory it kept allocated is
+  recorded, which is a lower bound.
+
+Measurements are recorded in a phase, 'train' or 'predict' (the default), set
+with `phase` for the calls made in a block.
+"""
+
+# Built-in imports
+import threading
+import tracemalloc
+from time import perf_counter
+from time import process_time
+from contextlib import contextmanager
+
+# Local imports
+from src import config
+
+
+# Prometheus metrics: attribute of a Record, name, type and help
+METRICS = [
+    ('calls', 'upwork_pipeline_step_calls_total', 'counter',
+     'Calls of each step of the learning pipeline'),
+    ('wall_seconds', 'upwork_pipeline_step_wall_seconds_total', 'counter',
+     'Wall time spent in each step'),
+    ('cpu_seconds', 'upwork_pipeline_step_cpu_seconds_total', 'counter',
+     'CPU time of the process while in each step'),
+    ('peak_bytes', 'upwork_pipeline_step_peak_bytes', 'gauge',
+     'Largest memory allocated during a call of each step, above the memory allocated when it started'),
+]
+
+local = threading.local()
+lock = threading.Lock()
+totals = {}     # (phase, step, method) -> Record
+open_peaks = [] # Memory measurements in progress, in every thread
+
+
+class Record:
+    """ Totals of the calls of a step """
+    def __init__(self):
+        self.calls        = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds  = 0.0
+        self.peak_bytes   = None
+
+    def add(self, wall_seconds, cpu_seconds, peak_bytes):
+        self.calls += 1
+        self.wall_seconds += wall_seconds
+        self.cpu_seconds += cpu_seconds
+        if peak_bytes is not None:
+            self.peak_bytes = max(self.peak_bytes or 0, peak_bytes)
+
+    def to_dict(self):
+        return {
+            'calls'       : self.calls,
+            'wall_seconds': round(self.wall_seconds, 4),
+            'cpu_seconds' : round(self.cpu_seconds, 4),
+            'peak_bytes'  : self.peak_bytes,
+        }
+
+
+class Profile:
+    """ Measurements made in a thread while collecting, see `collect` """
+    def __init__(self):
+        self.records = {}
+
+    def add(self, key, *values):
+        self.records.setdefault(key, Record()).add(*values)
+
+    def to_dict(self):
+        """ One dict per step and method, slowest first """
+        rows = [
+            {'phase': phase, 'step': step, 'method': method, **record.to_dict()}
+            for (phase, step, method), record in self.records.items()
+        ]
+        return sorted(rows, key=lambda row: -row['wall_seconds'])
+
+
+# tracemalloc.reset_peak is new in Python 3.9
+CAN_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+
+class Peak:
+    """
+    Memory measurement in progress. tracemalloc has a single peak for the
+    whole process, which is reset when a measurement starts, if possible; the
+    peak so far is first kept in every measurement in progress.
+    """
+    def __init__(self, start, process_peak):
+        self.start        = start
+        self.peak         = start
+        self.process_peak = process_peak
+
+
+def start_peak():
+    if not config.PROFILE_MEMORY:
+        return None
+
+    with lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        if CAN_RESET_PEAK:
+            for measurement in open_peaks:
+                measurement.peak = max(measurement.peak, peak)
+            tracemalloc.reset_peak()
+        measurement = Peak(current, peak)
+        open_peaks.append(measurement)
+        return measurement
+
+
+def stop_peak(measurement):
+    """ Bytes allocated at the peak of the measurement, above its start """
+
+    if measurement is None:
+        return None
+
+    with lock:
+        open_peaks.remove(measurement)
+        if not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        if not CAN_RESET_PEAK and peak <= measurement.process_peak:
+            # The peak of the process was reached before the step
+            return max(current - measurement.start, 0)
+        return max(measurement.peak, peak) - measurement.start
+
+
+def current_phase():
+    return getattr(local, 'phase', 'predict')
+
+
+@contextmanager
+def phase(name):
+    """ Record the measurements made in the block in phase `name` """
+
+    previous = current_phase()
+    local.phase = name
+    try:
+        yield
+    finally:
+        local.phase = previous
+
+
+@contextmanager
+def collect():
+    """ Collect the measurements made in this thread in the block in a Profile """
+
+    profile = Profile()
+    profiles = local.__dict__.setdefault('profiles', [])
+    profiles.append(profile)
+    try:
+        yield profile
+    finally:
+        profiles.remove(profile)
+
+
+@contextmanager
+def measure(step, method):
+    """ Measure the block as a call of `method` of `step` """
+
+    if not config.PROFILE_STEPS:
+        yield
+        return
+
+    peak = start_peak()
+    wall, cpu = perf_counter(), process_time()
+    try:
+        yield
+    finally:
+        values = (perf_counter() - wall, process_time() - cpu, stop_peak(peak))
+        key = (current_phase(), step, method)
+        with lock:
+            totals.setdefault(key, Record()).add(*values)
+        for profile in getattr(local, 'profiles', []):
+            profile.add(key, *values)
+
+
+def measure_chunks(chunks, step, method):
+    """ Yield the items of `chunks`, measuring how long each one takes to produce """
+
+    chunks = iter(chunks)
+    while True:
+        with measure(step, method):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus():
+    """ Totals of every step, in the Prometheus text exposition format """
+
+    with lock:
+        records = {key: record.to_dict() for key, record in totals.items()}
+
+    lines = []
+    for attribute, name, type, help in METRICS:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+        for (phase, step, method), record in sorted(records.items()):
+            if record[attribute] is None:
+                continue
+            labels = ','.join(
+                f'{label}="{label_value(value)}"'
+                for label, value in [('phase', phase), ('step', step), ('method', method)]
+            )
+            lines.append(f"{name}{{{labels}}} {record[attribute]}")
+    return '\n'.join(lines) + '\n'
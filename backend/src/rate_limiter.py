@@ -0,0 +1,102 @@
+# Built-in imports
+import time
+import random
+import threading
+
+# External imports
+import requests
+
+# Local imports
+from src.exceptions import RateLimitedError
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Every API call takes one token; tokens are
+    refilled at `rate` per second up to `capacity`, so callers can make at most
+    `capacity` requests back to back and `rate` requests per second on average.
+    """
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+        self.rate     = rate
+        self.capacity = max(1, capacity)
+        self.clock    = clock
+        self.sleep    = sleep
+        self.tokens   = self.capacity
+        self.updated  = clock()
+        self.lock     = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it.
+
+        Returns:
+            The number of seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+def is_retryable(error):
+    """ Whether a failed API call is worth repeating """
+
+    if isinstance(error, (requests.exceptions.ConnectionError, RateLimitedError)):
+        return True
+
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        return response is not None and response.status_code == 429
+
+    return False
+
+
+def retry_after(error):
+    """ Seconds requested by the server through the Retry-After header """
+
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retries(func, retries, backoff, sleep=time.sleep):
+    """
+    Call `func` and repeat it with exponential backoff while it fails with a
+    retryable error (connection problems or the API rate limit being hit).
+
+    Args:
+        func   : Callable without arguments
+        retries: Maximum number of extra attempts
+        backoff: Seconds to wait after the first failure, doubled each time
+
+    Returns:
+        Whatever `func` returns
+    """
+
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = retry_after(e) or backoff * 2 ** attempt
+            delay *= 1 + random.uniform(0, 0.1) # Jitter, so workers spread out
+            print(f"{type(e).__name__}, retrying in {delay:.1f} seconds...")
+            sleep(delay)
@@ -0,0 +1,180 @@
+"""
+Versioned model registry.
+
+Every trained model is saved in its own directory of MODELS_DIR together with
+the features and report computed from its training data and a meta.json file
+with the data fingerprint, metrics and timings:
+
+    MODELS_DIR/
+        CURRENT                  <- name of the served version
+        20261018-104500-3f2a/
+            model.joblib
+            features.joblib
+            meta.json
+
+Versions are written to a temporary directory and renamed into place, and
+promoted by atomically replacing CURRENT, so a reader never sees a partially
+written model and retraining never touches the version being served.
+"""
+
+# Built-in imports
+import os
+import json
+import shutil
+import pickle
+from uuid import uuid4
+from pathlib import Path
+from functools import lru_cache
+from datetime import datetime, timezone
+
+# External imports
+import joblib
+import pandas as pd
+
+# Local imports
+from src import config
+
+
+def models_dir():
+    path = Path(config.MODELS_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def atomic_write(path, write):
+    """ Write a file through `write(tmp_path)` and move it into place """
+
+    tmp = path.with_name(f".{path.name}.{uuid4().hex}")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def list_versions():
+    """ Saved versions, oldest first """
+    return sorted(
+        p.name for p in models_dir().iterdir()
+        if p.is_dir() and not p.name.startswith('.')
+    )
+
+
+def current_version():
+    """ Name of the served version, or None if there is none """
+
+    path = models_dir() / 'CURRENT'
+    if not path.exists():
+        return import_legacy_model()
+    version = path.read_text().strip()
+    return version if (models_dir() / version).is_dir() else None
+
+
+def import_legacy_model():
+    """ Register the single model.pkl used before the registry existed """
+
+    legacy = Path(config.MODEL_FILENAME)
+    if not legacy.exists():
+        return None
+
+    print(f"Importing {legacy} into the model registry...")
+    model = pickle.load(open(legacy, 'rb'))
+    version = save_version(model, meta={'imported_from': str(legacy)})
+    promote(version)
+    return version
+
+
+def save_version(model, features=None, meta=None):
+    """
+    Save a new version. It isn't served until it's promoted.
+
+    Args:
+        model   : Fitted model
+        features: Optional dict with the data 'fingerprint', the
+                  'label_encoder', the transformed 'X_train'/'X_test',
+                  'y_train'/'y_test' and the 'report'
+        meta    : Dict of JSON-serializable information about the model
+
+    Returns:
+        Name of the new version
+    """
+
+    created = datetime.now(tz=timezone.utc)
+    version = f"{created:%Y%m%d-%H%M%S}-{uuid4().hex[:4]}"
+    meta = dict(meta or {}, version=version, created=created.isoformat())
+
+    tmp = models_dir() / f".{version}"
+    tmp.mkdir()
+    try:
+        joblib.dump(model, tmp / 'model.joblib')
+        if features is not None:
+            joblib.dump(features, tmp / 'features.joblib')
+        (tmp / 'meta.json').write_text(json.dumps(meta, indent=2, default=str))
+        tmp.rename(models_dir() / version)
+    except:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    return version
+
+
+def promote(version):
+    """ Serve `version` from now on and delete the oldest unused versions """
+
+    if not (models_dir() / version).is_dir():
+        raise ValueError(f"Unknown model version {version}")
+
+    atomic_write(models_dir() / 'CURRENT', lambda tmp: tmp.write_text(version))
+    print(f"Model version {version} promoted.")
+
+    old = [v for v in list_versions() if v != version]
+    for v in old[:max(len(old) - config.MODEL_VERSIONS_TO_KEEP + 1, 0)]:
+        shutil.rmtree(models_dir() / v, ignore_errors=True)
+
+
+@lru_cache(maxsize=config.MODEL_CACHE_SIZE)
+def load_model(version):
+    """
+    Load a version's model. Loaded models are kept in memory, and their large
+    arrays (e.g. the SVD components) are memory-mapped instead of copied.
+    """
+    print(f"Loading model {version}...")
+    model = joblib.load(models_dir() / version / 'model.joblib', mmap_mode='r')
+    print("Model loaded.")
+    return model
+
+
+def load_meta(version):
+    return json.loads((models_dir() / version / 'meta.json').read_text())
+
+
+def update_meta(version, **values):
+    meta = load_meta(version)
+    meta.update(values)
+    atomic_write(
+        models_dir() / version / 'meta.json',
+        lambda tmp: tmp.write_text(json.dumps(meta, indent=2, default=str))
+    )
+
+
+def load_classes(version):
+    """ Class names of a version, in the order of its encoded labels """
+
+    classes = load_meta(version).get('classes')
+    path = models_dir() / version / 'features.joblib'
+    if classes is None and path.exists():
+        classes = list(joblib.load(path)['label_encoder'].classes_)
+    return classes
+
+
+def load_report(version):
+    """
+    Performance report of a version on its test split, as saved when it was
+    trained, or an empty DataFrame for versions imported without one.
+    """
+
+    metrics = load_meta(version).get('metrics')
+    if metrics is None:
+        return pd.DataFrame()
+    return pd.DataFrame.from_dict(metrics, orient='index')
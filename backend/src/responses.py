@@ -0,0 +1,116 @@
+"""
+JSON responses of the routes that return jobs.
+
+- `fields=id,title,...` only returns those fields of each job.
+- `format=columns` returns the jobs as one list per field instead of one
+  object per job, so the field names aren't repeated for every job.
+- Bodies are encoded with orjson when it's installed, and with the json
+  module otherwise. Both write dates as ISO 8601.
+- Bodies of at least RESPONSE_GZIP_MIN_BYTES are gzipped for clients that
+  accept it.
+- GET responses have an ETag; a request whose If-None-Match matches it gets
+  an empty 304 response.
+"""
+
+# Built-in imports
+import gzip
+import json
+import hashlib
+import datetime
+
+# External imports
+import numpy as np
+from flask import request
+from flask import Response
+
+# Local imports
+from src import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def to_builtin(value):
+    """ JSON-compatible form of the values the json module can't encode """
+
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(payload):
+    """ Compact JSON bytes """
+
+    if orjson is not None:
+        return orjson.dumps(
+            payload,
+            default = to_builtin,
+            option  = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(payload, default=to_builtin, separators=(',', ':')).encode()
+
+
+def requested_fields():
+    """ Fields asked for with `fields`, or None for all of them """
+
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    return fields or None
+
+
+def requested_format():
+    """ Format asked for with `format`, 'records' by default """
+
+    format = request.args.get('format', 'records')
+    if format not in ('records', 'columns'):
+        raise ValueError("format must be 'records' or 'columns'")
+    return format
+
+
+def shape(jobs, fields=None, format=None):
+    """
+    Project a list of job dicts to `fields` and lay them out as `format`,
+    by default as asked in the request.
+
+    Args:
+        fields: Field names; 'id' is always kept
+        format: 'records' (a list of dicts) or 'columns' (a dict of lists)
+    """
+
+    fields = fields or requested_fields()
+    format = format or requested_format()
+
+    if fields is not None:
+        if 'id' not in fields:
+            fields = ['id'] + fields
+        jobs = [{f: job.get(f) for f in fields} for job in jobs]
+
+    if format == 'columns':
+        names = fields or list(dict.fromkeys(f for job in jobs for f in job))
+        return {f: [job.get(f) for job in jobs] for f in names}
+    return jobs
+
+
+def respond(payload, status=200):
+    """ Response with the JSON of `payload`, with an ETag and gzip if possible """
+
+    body = dumps(payload)
+    response = Response(body, status=status, mimetype='application/json')
+
+    if request.method in ('GET', 'HEAD') and status == 200:
+        # Weak: the gzipped and the plain bodies are the same representation
+        response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest(), weak=True)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    response.vary.add('Accept-Encoding')
+    if 'gzip' in request.accept_encodings and len(body) >= config.RESPONSE_GZIP_MIN_BYTES:
+        response.set_data(gzip.compress(body, compresslevel=config.RESPONSE_GZIP_LEVEL))
+        response.content_encoding = 'gzip'
+    return response
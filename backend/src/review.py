@@ -0,0 +1,120 @@
+"""
+Review queue for active learning: the unlabeled jobs the served model is
+least sure about, whose labels teach it the most.
+
+Uncertainty is stored with the predictions by predictions.score_jobs, so
+building the queue only scores the jobs downloaded since the last time and
+sorts the stored values of the window. Uncertain jobs tend to come
+in groups of similar jobs; labeling one of them is enough, so the queue
+skips jobs of a cluster it already has and jobs whose MinHash signature is
+too similar to the one of a job it already has, see dedupe.py.
+"""
+
+# Built-in imports
+import json
+from time import time
+
+# External imports
+import numpy as np
+
+# Local imports
+from src import db
+from src import config
+from src import registry
+from src.dedupe import similarity
+from src.predictions import score_jobs
+
+
+# Column and direction that put the most uncertain jobs first
+ORDERS = {
+    'margin' : 'margin ASC',
+    'entropy': 'entropy DESC',
+}
+
+
+def load_candidates(version, since, measure, n_candidates):
+    """ The most uncertain unlabeled jobs scored by `version`, most uncertain first """
+
+    with db.read() as conn:
+        jobs = conn.execute(
+            f"""SELECT * FROM {config.TABLE_NAME}
+                WHERE label = 'Uncategorized' AND model_version = ? AND created_epoch >= ?
+                ORDER BY {ORDERS[measure]}
+                LIMIT ?""",
+            (version, since, n_candidates)
+        ).fetchall()
+
+        ids = [job['id'] for job in jobs]
+        signatures = dict(conn.execute(
+            f"SELECT job_id, signature FROM {config.SIGNATURES_TABLE} "
+            f"WHERE job_id IN ({','.join('?' * len(ids))})",
+            ids
+        ).fetchall())
+
+    return [dict(job) for job in jobs], signatures
+
+
+def diverse(jobs, signatures, limit, max_similarity=None):
+    """
+    Pick up to `limit` jobs in order, skipping the ones that are in the
+    cluster of a picked job or too similar to one.
+
+    Args:
+        signatures    : Dict of job id -> MinHash signature bytes; jobs that
+                        weren't clustered yet have none
+        max_similarity: By default REVIEW_MAX_SIMILARITY
+    """
+
+    max_similarity = config.REVIEW_MAX_SIMILARITY if max_similarity is None else max_similarity
+    picked, clusters, picked_signatures = [], set(), []
+    for job in jobs:
+        cluster = job['cluster_id'] or job['id']
+        if cluster in clusters:
+            continue
+
+        signature = signatures.get(job['id'])
+        if signature is not None:
+            signature = np.frombuffer(signature, dtype=np.uint32)
+            if any(similarity(signature, other) > max_similarity for other in picked_signatures):
+                continue
+            picked_signatures.append(signature)
+
+        picked.append(job)
+        clusters.add(cluster)
+        if len(picked) == limit:
+            break
+    return picked
+
+
+def review_queue(limit=20, window_days=None, measure=None):
+    """
+    Unlabeled jobs to label next, most uncertain first.
+
+    Args:
+        limit      : Number of jobs
+        window_days: How many days to look back, by default REVIEW_DAYS
+        measure    : 'margin' or 'entropy', by default REVIEW_UNCERTAINTY
+
+    Returns:
+        List of dicts with the job, its stored predictions and their
+        uncertainty. Empty when there's no served model.
+    """
+
+    window_days = config.REVIEW_DAYS if window_days is None else window_days
+    measure = measure or config.REVIEW_UNCERTAINTY
+    if measure not in ORDERS:
+        raise ValueError(f"Unknown uncertainty '{measure}', use one of: {', '.join(ORDERS)}")
+
+    version = registry.current_version()
+    if version is None:
+        return []
+
+    # Only the jobs downloaded since the last call need to be scored
+    since = int(time() - window_days * 86400)
+    score_jobs(version, since=since)
+
+    jobs, signatures = load_candidates(version, since, measure, limit * config.REVIEW_CANDIDATES)
+    jobs = diverse(jobs, signatures, limit)
+    for job in jobs:
+        job['scores'] = json.loads(job['scores'])
+    return jobs
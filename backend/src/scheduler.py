@@ -0,0 +1,205 @@
+# Built-in imports
+import threading
+import traceback
+from uuid import uuid4
+from time import time
+from time import monotonic
+from contextlib import contextmanager
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+def utc_now():
+    return datetime.now(tz=timezone.utc).isoformat(timespec='seconds')
+
+
+class Run:
+    """
+    One execution of a background task. The task reports its progress through
+    `increment`, `set` and `error`, which can be called from any thread.
+    """
+    def __init__(self, reason):
+        self.id       = uuid4().hex[:12]
+        self.reason   = reason # 'request' or 'schedule'
+        self.state    = 'queued'
+        self.created  = utc_now()
+        self.started  = None
+        self.finished = None
+        self.progress = {}
+        self.errors   = []
+        self.lock     = threading.Lock()
+
+    def increment(self, key, n=1):
+        with self.lock:
+            self.progress[key] = self.progress.get(key, 0) + n
+
+    def set(self, key, value):
+        with self.lock:
+            self.progress[key] = value
+
+    def error(self, msg):
+        with self.lock:
+            self.errors.append(msg)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'id'      : self.id,
+                'reason'  : self.reason,
+                'state'   : self.state,
+                'created' : self.created,
+                'started' : self.started,
+                'finished': self.finished,
+                'progress': dict(self.progress),
+                'errors'  : list(self.errors),
+            }
+
+
+class Stages:
+    """
+    Stage-level progress of a Run: the stage in progress, the seconds each
+    finished stage took and, when `expected` has the seconds every stage took
+    the previous time, an estimate of the remaining seconds. Without a Run,
+    only the durations are recorded.
+    """
+    def __init__(self, run=None, names=(), expected=None):
+        self.run       = run
+        self.names     = list(names)
+        self.expected  = expected or {}
+        self.durations = {}
+        self.set('stages', self.names)
+
+    def set(self, key, value):
+        if self.run is not None:
+            self.run.set(key, value)
+
+    @contextmanager
+    def stage(self, name):
+        """ Report `name` as the stage in progress while in the block """
+
+        start = time()
+        self.set('stage', name)
+        self.set('stage_started', start)
+        self.set('remaining_seconds', self.remaining(name))
+        try:
+            yield
+        finally:
+            self.durations[name] = round(time() - start, 2)
+            self.set('stage_seconds', dict(self.durations))
+
+    def remaining(self, name):
+        """ Expected seconds from the start of stage `name` to the end """
+
+        if name not in self.names:
+            return None
+        left = self.names[self.names.index(name):]
+        if any(n not in self.expected for n in left):
+            return None
+        return round(sum(self.expected[n] for n in left), 2)
+
+    @staticmethod
+    def eta(progress):
+        """
+        Seconds left of a run, from the progress it reported: the expected
+        remaining seconds when its stage started minus the time since.
+        """
+
+        remaining = progress.get('remaining_seconds')
+        if remaining is None or progress.get('stage_started') is None:
+            return None
+        return max(0, round(remaining - (time() - progress['stage_started']), 1))
+
+
+class BackgroundWorker:
+    """
+    Runs a task in a single background thread, one run at a time.
+
+    Submitting while a run is queued or in progress doesn't stack another one:
+    the id of the existing run is returned instead. With an `interval`, a run
+    is also queued every `interval` seconds after the previous one finished.
+    """
+    def __init__(self, name, task, interval=None, history=20):
+        self.name     = name
+        self.task     = task # Called with the Run as its only argument
+        self.interval = interval or None
+        self.history  = history
+        self.runs     = OrderedDict()
+        self.queued   = None
+        self.running  = None
+        self.thread   = None
+        self.lock     = threading.Condition()
+
+    def start(self):
+        """ Start the worker thread, if it isn't running yet """
+
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.loop, name=self.name, daemon=True)
+                self.thread.start()
+
+    def submit(self, reason='request'):
+        """
+        Queue a run unless one is already queued or in progress.
+
+        Returns:
+            The id of the run that will do the work
+        """
+
+        self.start()
+        with self.lock:
+            return self.enqueue(reason)
+
+    def enqueue(self, reason):
+        """ Like `submit`, with the lock already held """
+
+        current = self.queued or self.running
+        if current is not None:
+            return current.id
+
+        run = self.queued = Run(reason)
+        self.runs[run.id] = run
+        while len(self.runs) > self.history:
+            self.runs.popitem(last=False)
+        self.lock.notify()
+        return run.id
+
+    def status(self, run_id=None):
+        """ Status of a run, by default the most recent one """
+
+        with self.lock:
+            if run_id is None:
+                run = next(reversed(self.runs.values()), None)
+            else:
+                run = self.runs.get(run_id)
+        return None if run is None else run.to_dict()
+
+    def loop(self):
+        next_run = None if self.interval is None else monotonic() + self.interval
+
+        while True:
+            with self.lock:
+                while self.queued is None:
+                    timeout = None if next_run is None else next_run - monotonic()
+                    if timeout is not None and timeout <= 0:
+                        self.enqueue('schedule')
+                        break
+                    self.lock.wait(timeout)
+
+                run = self.running = self.queued
+                self.queued = None
+                run.state = 'running'
+                run.started = utc_now()
+
+            try:
+                self.task(run)
+                run.state = 'done'
+            except Exception as e:
+                traceback.print_exc()
+                run.error(f"{type(e).__name__}: {e}")
+                run.state = 'failed'
+            finally:
+                with self.lock:
+                    run.finished = utc_now()
+                    self.running = None
+                if self.interval is not None:
+                    next_run = monotonic() + self.interval
@@ -0,0 +1,393 @@
+"""
+Schema of the jobs database and its migrations.
+
+The schema is built by the functions in MIGRATIONS, applied in order. The
+number of migrations applied to a database is stored in its user_version, so
+`upgrade_database` only runs the new ones. It runs at startup and before the
+first use of a database in a process.
+
+Databases created before the migrations existed were built by ad-hoc
+"create if missing" helpers, so every migration is written to be a no-op on
+what already exists.
+
+To change the schema, append a migration; never edit one that was released.
+"""
+
+# Built-in imports
+import os
+import sqlite3 as sql
+from contextlib import closing
+
+# Local imports
+from src import config
+
+
+# Columns of the jobs table. The names of FIELDS_NAMES must be among them.
+JOBS_COLUMNS = [
+    ('id'                                  , 'TEXT PRIMARY KEY'),
+    ('title'                               , 'TEXT NOT NULL'),
+    ('snippet'                             , 'TEXT NOT NULL'),
+    ('job_type'                            , 'TEXT NOT NULL'),
+    ('budget'                              , 'INTEGER NOT NULL'),
+    ('job_status'                          , 'TEXT NOT NULL'),
+    ('category2'                           , 'TEXT NOT NULL'),
+    ('subcategory2'                        , 'TEXT NOT NULL'),
+    ('url'                                 , 'TEXT NOT NULL'),
+    ('workload'                            , 'TEXT'),
+    ('duration'                            , 'TEXT'),
+    ('date_created'                        , 'TIMESTAMP_TZ'),
+    ('skills'                              , 'TEXT'),
+    ('client.feedback'                     , 'INTEGER'),
+    ('client.reviews_count'                , 'INTEGER'),
+    ('client.jobs_posted'                  , 'INTEGER'),
+    ('client.payment_verification_status'  , 'TEXT'),
+    ('client.past_hires'                   , 'INTEGER'),
+    ('client.country'                      , 'TEXT'),
+    ('label'                               , 'TEXT'),
+]
+
+PREDICTION_COLUMNS = {
+    'predicted_label': 'TEXT', # Most likely class
+    'score'          : 'REAL', # Its pseudo-probability
+    'scores'         : 'TEXT', # JSON object of class -> pseudo-probability
+    'model_version'  : 'TEXT', # Version of the model that scored the job
+}
+
+UNCERTAINTY_COLUMNS = {
+    'margin' : 'REAL', # Difference between the two largest class scores
+    'entropy': 'REAL', # Entropy of the class scores, divided by its maximum
+}
+
+# Databases upgraded by this process, by absolute path
+_upgraded = set()
+
+
+def connect(database=None, **kwargs):
+    """ sqlite3.connect with the connection pragmas of SQLITE_PRAGMAS """
+
+    conn = sql.connect(database or config.DATABASE, **kwargs)
+    apply_pragmas(conn)
+    return conn
+
+
+def apply_pragmas(conn):
+    for name, value in config.SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def add_missing_columns(conn, table, columns):
+    """ ALTER TABLE ADD COLUMN the (name, type) pairs the table doesn't have """
+
+    existing = set(table_columns(conn, table))
+    for column, column_type in columns:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}" {column_type}')
+
+
+def create_jobs_table(conn):
+    columns = ',\n'.join(f'"{name}" {column_type}' for name, column_type in JOBS_COLUMNS)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {config.TABLE_NAME} (\n{columns}\n)")
+
+
+def create_side_tables(conn):
+    """
+    Tables used by the downloader and the learner besides the jobs table:
+    - the crawl cursor of each search term, see crawl_state.py
+    - which search terms matched each job, see planner.py
+    - the token cache, see token_cache.py
+    - counters of changes to the data, of which the number of label changes
+      is kept by a trigger; see utils.data_fingerprint
+    """
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {config.CRAWL_STATE_TABLE} (
+            term TEXT PRIMARY KEY,
+            date_created TIMESTAMP_TZ NOT NULL,
+            job_id TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS {config.JOB_TERMS_TABLE} (
+            job_id TEXT NOT NULL,
+            term TEXT NOT NULL,
+            PRIMARY KEY (job_id, term)
+        );
+
+        CREATE TABLE IF NOT EXISTS {config.TOKEN_CACHE_TABLE} (
+            hash TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            tokens TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS {config.DATA_VERSION_TABLE} (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO {config.DATA_VERSION_TABLE} (key, value) VALUES ('label_changes', 0);
+
+        CREATE TRIGGER IF NOT EXISTS count_label_changes
+        AFTER UPDATE OF label ON {config.TABLE_NAME}
+        WHEN OLD.label IS NOT NEW.label
+        BEGIN
+            UPDATE {config.DATA_VERSION_TABLE} SET value = value + 1 WHERE key = 'label_changes';
+        END;
+    """)
+
+
+def add_prediction_columns(conn):
+    """ Predictions of the served model, see predictions.py """
+    add_missing_columns(conn, config.TABLE_NAME, PREDICTION_COLUMNS.items())
+
+
+def add_created_epoch(conn):
+    """
+    Store date_created as seconds since the epoch in created_epoch, kept up to
+    date by a trigger, and index it together with the label. Sorting and
+    paginating by date then walks the index instead of parsing and sorting
+    the date of every row.
+    """
+
+    add_missing_columns(conn, config.TABLE_NAME, [('created_epoch', 'INTEGER')])
+
+    conn.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS set_created_epoch
+        AFTER INSERT ON {config.TABLE_NAME}
+        WHEN NEW.created_epoch IS NULL
+        BEGIN
+            UPDATE {config.TABLE_NAME}
+            SET created_epoch = CAST(strftime('%s', NEW.date_created) AS INTEGER)
+            WHERE rowid = NEW.rowid;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS update_created_epoch
+        AFTER UPDATE OF date_created ON {config.TABLE_NAME}
+        BEGIN
+            UPDATE {config.TABLE_NAME}
+            SET created_epoch = CAST(strftime('%s', NEW.date_created) AS INTEGER)
+            WHERE rowid = NEW.rowid;
+        END;
+
+        -- Rows inserted before the column or the triggers existed
+        UPDATE {config.TABLE_NAME}
+        SET created_epoch = CAST(strftime('%s', date_created) AS INTEGER)
+        WHERE created_epoch IS NULL AND date_created IS NOT NULL;
+
+        CREATE INDEX IF NOT EXISTS jobs_label_created
+        ON {config.TABLE_NAME} (label, created_epoch, id);
+    """)
+
+
+def create_search_index(conn):
+    """
+    FTS5 index of the title, snippet and skills of the jobs, see
+    db.search_jobs. It doesn't store a copy of the text: it's an external
+    content table over the jobs table, kept in sync by triggers and joined to
+    it by rowid. Since the jobs table has no INTEGER PRIMARY KEY, a VACUUM may
+    renumber its rowids; run `rebuild_search_index` after one.
+    """
+
+    fts, jobs = config.JOBS_FTS_TABLE, config.TABLE_NAME
+    conn.executescript(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            title, snippet, skills,
+            content = '{jobs}',
+            content_rowid = 'rowid',
+            tokenize = 'porter unicode61',
+            prefix = '2 3'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {jobs}
+        BEGIN
+            INSERT INTO {fts} (rowid, title, snippet, skills)
+            VALUES (NEW.rowid, NEW.title, NEW.snippet, NEW.skills);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {jobs}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, title, snippet, skills)
+            VALUES ('delete', OLD.rowid, OLD.title, OLD.snippet, OLD.skills);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS {fts}_update
+        AFTER UPDATE OF title, snippet, skills ON {jobs}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, title, snippet, skills)
+            VALUES ('delete', OLD.rowid, OLD.title, OLD.snippet, OLD.skills);
+            INSERT INTO {fts} (rowid, title, snippet, skills)
+            VALUES (NEW.rowid, NEW.title, NEW.snippet, NEW.skills);
+        END;
+    """)
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn):
+    """ Index all the jobs again, e.g. to add the jobs inserted before it existed """
+    conn.execute(f"INSERT INTO {config.JOBS_FTS_TABLE} ({config.JOBS_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def create_duplicate_clusters(conn):
+    """
+    Near-duplicate clusters of the jobs, see dedupe.py: the cluster_id of each
+    job, and the MinHash signatures and LSH buckets used to find them.
+    """
+
+    add_missing_columns(conn, config.TABLE_NAME, [('cluster_id', 'TEXT')])
+    conn.executescript(f"""
+        CREATE INDEX IF NOT EXISTS jobs_cluster_created
+        ON {config.TABLE_NAME} (cluster_id, created_epoch);
+
+        CREATE TABLE IF NOT EXISTS {config.SIGNATURES_TABLE} (
+            job_id TEXT PRIMARY KEY,
+            signature BLOB NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS {config.LSH_TABLE} (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            job_id TEXT NOT NULL,
+            PRIMARY KEY (band, bucket, job_id)
+        ) WITHOUT ROWID;
+    """)
+
+
+def add_uncertainty_columns(conn):
+    """
+    How uncertain the served model is about each unlabeled job, see
+    review.py. Jobs scored before are scored again by
+    predictions.score_jobs to fill them. They aren't indexed: the review
+    queue reads the jobs of a window through jobs_label_created and sorts
+    only those.
+    """
+    add_missing_columns(conn, config.TABLE_NAME, UNCERTAINTY_COLUMNS.items())
+
+
+def key_search_index(conn):
+    """
+    Join the search index to the jobs by a `search_key` column instead of the
+    rowid. The jobs table has no INTEGER PRIMARY KEY, so its rowids may be
+    renumbered by a VACUUM; `search_key` is an INTEGER column of its own, set
+    when a job is inserted and never changed. FTS5 can't change the
+    content_rowid of a table, so the index is created again.
+    """
+
+    fts, jobs = config.JOBS_FTS_TABLE, config.TABLE_NAME
+    add_missing_columns(conn, jobs, [('search_key', 'INTEGER')])
+    conn.executescript(f"""
+        UPDATE {jobs} SET search_key = rowid WHERE search_key IS NULL;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_search_key ON {jobs} (search_key);
+
+        DROP TRIGGER IF EXISTS {fts}_insert;
+        DROP TRIGGER IF EXISTS {fts}_delete;
+        DROP TRIGGER IF EXISTS {fts}_update;
+        DROP TABLE IF EXISTS {fts};
+
+        CREATE VIRTUAL TABLE {fts} USING fts5(
+            title, snippet, skills,
+            content = '{jobs}',
+            content_rowid = 'search_key',
+            tokenize = 'porter unicode61',
+            prefix = '2 3'
+        );
+
+        CREATE TRIGGER {fts}_insert AFTER INSERT ON {jobs}
+        BEGIN
+            UPDATE {jobs}
+            SET search_key = (SELECT IFNULL(MAX(search_key), 0) + 1 FROM {jobs})
+            WHERE rowid = NEW.rowid AND search_key IS NULL;
+            INSERT INTO {fts} (rowid, title, snippet, skills)
+            SELECT search_key, title, snippet, skills FROM {jobs} WHERE rowid = NEW.rowid;
+        END;
+
+        CREATE TRIGGER {fts}_delete AFTER DELETE ON {jobs}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, title, snippet, skills)
+            VALUES ('delete', OLD.search_key, OLD.title, OLD.snippet, OLD.skills);
+        END;
+
+        CREATE TRIGGER {fts}_update
+        AFTER UPDATE OF title, snippet, skills ON {jobs}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, title, snippet, skills)
+            VALUES ('delete', OLD.search_key, OLD.title, OLD.snippet, OLD.skills);
+            INSERT INTO {fts} (rowid, title, snippet, skills)
+            VALUES (NEW.search_key, NEW.title, NEW.snippet, NEW.skills);
+        END;
+    """)
+    rebuild_search_index(conn)
+
+
+# Append only: the position of a migration is its schema version
+MIGRATIONS = [
+    create_jobs_table,
+    create_side_tables,
+    add_prediction_columns,
+    add_created_epoch,
+    create_search_index,
+    create_duplicate_clusters,
+    add_uncertainty_columns,
+    key_search_index,
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Apply the migrations the database doesn't have yet.
+
+    Returns:
+        List of the names of the applied migrations
+    """
+
+    version = schema_version(conn)
+    if version > len(MIGRATIONS):
+        raise RuntimeError(
+            f"The database schema (version {version}) is newer than this code "
+            f"(version {len(MIGRATIONS)})"
+        )
+
+    applied = []
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f"Migrating the database to version {number}: {migration.__name__}")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+        applied.append(migration.__name__)
+    return applied
+
+
+def check_fields(conn):
+    """ Fail if a field in FIELDS_NAMES has no column in the jobs table """
+
+    if config.FIELDS_NAMES[0] != 'id':
+        raise RuntimeError("'id' must be the first field of FIELDS_NAMES")
+
+    missing = set(config.FIELDS_NAMES) - set(table_columns(conn, config.TABLE_NAME))
+    if missing:
+        raise RuntimeError(
+            f"FIELDS_NAMES has fields without a column in {config.TABLE_NAME}: "
+            f"{', '.join(sorted(missing))}. Add them to the schema with a migration."
+        )
+
+
+def upgrade_database(database=None):
+    """
+    Create or migrate a database and check it against FIELDS_NAMES. Only the
+    first call per database does any work in a process.
+    """
+
+    database = database or config.DATABASE
+    path = os.path.abspath(database)
+    if path in _upgraded:
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with closing(connect(database, timeout=30)) as conn:
+        migrate(conn)
+        check_fields(conn)
+    _upgraded.add(path)
@@ -0,0 +1,116 @@
+"""
+Pseudo-probabilities of the classifiers and selection of the best scored
+jobs, on NumPy arrays.
+
+Nothing here assumes a number of classes or their names: a binary
+classifier's single decision value is turned into two columns, and the
+classes are ordered by a list of preferred ones followed by the rest.
+Selecting the best `n` jobs of each class takes an `argpartition` per class,
+linear in the number of jobs, and only the selected ones are sorted.
+"""
+
+# External imports
+import numpy as np
+
+
+# Fields of the jobs returned by /predict, besides the score of each class
+RECORD_FIELDS = [
+    'id', 'title', 'snippet', 'url', 'job_type', 'budget', 'skills',
+    'date_created', 'cluster_id', 'predicted', 'score',
+]
+
+
+def decision_matrix(decision):
+    """
+    Decision values as an array of shape (n_rows, n_classes). Binary
+    classifiers return one value per row, positive for the second class.
+    """
+
+    decision = np.asarray(decision, dtype=float)
+    if decision.ndim == 1:
+        decision = np.column_stack([-decision, decision])
+    return decision
+
+
+def softmax(decision):
+    """
+    Softmax of each row. The row's maximum is subtracted before the
+    exponential, which doesn't change the result but keeps it from
+    overflowing with large decision values.
+    """
+
+    z = decision - decision.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def uncertainty(pseudo_probs):
+    """
+    How unsure the model is about each row of pseudo-probabilities.
+
+    Returns:
+        The margin between the two most likely classes, small when unsure,
+        and the entropy divided by its maximum log(n_classes), in [0, 1] and
+        large when unsure
+    """
+
+    top_two = np.sort(pseudo_probs, axis=1)[:, -2:]
+    margin = top_two[:, 1] - top_two[:, 0]
+
+    p = np.clip(pseudo_probs, 1e-12, 1)
+    entropy = -np.sum(p * np.log(p), axis=1) / np.log(pseudo_probs.shape[1])
+    return margin, entropy
+
+
+def class_order(classes, preferred=()):
+    """ The `preferred` classes that are in `classes`, then the others sorted """
+
+    classes = set(classes)
+    return [c for c in preferred if c in classes] + sorted(classes - set(preferred))
+
+
+def top_n(scores, rows, n):
+    """ The `n` rows with the highest score, highest first """
+
+    if n is not None and len(rows) > n:
+        rows = rows[np.argpartition(-scores[rows], n - 1)[:n]]
+    return rows[np.argsort(-scores[rows], kind='stable')]
+
+
+def top_n_per_class(predicted, scores, n, preferred=()):
+    """
+    Indices of the `n` highest scored rows of each predicted class, by class
+    in the order of `class_order(predicted, preferred)` and by decreasing
+    score within a class.
+
+    Args:
+        predicted: Array of the predicted class of each row
+        scores   : Array of the score of each row
+        n        : Rows per class, or None for all of them
+    """
+
+    predicted = np.asarray(predicted)
+    scores = np.asarray(scores, dtype=float)
+    selected = [
+        top_n(scores, np.flatnonzero(predicted == c), n)
+        for c in class_order(np.unique(predicted), preferred)
+    ]
+    return np.concatenate(selected) if selected else np.array([], dtype=int)
+
+
+def select(predicted, scores, n, preferred=()):
+    """
+    Indices of the `n` rows to show: the best of the first class of
+    `class_order`, then of the next one, and so on.
+    """
+    return top_n_per_class(predicted, scores, n, preferred)[:n]
+
+
+def records(jobs, rows, classes=()):
+    """
+    The selected rows of a DataFrame of jobs as dicts of plain values, with
+    only RECORD_FIELDS and the score of each of `classes`.
+    """
+
+    fields = [f for f in RECORD_FIELDS + list(classes) if f in jobs.columns]
+    return jobs.iloc[rows][fields].to_dict('records')
@@ -0,0 +1,110 @@
+# Built-in imports
+import json
+import hashlib
+import threading
+import sqlite3 as sql
+
+# Local imports
+from src import config
+from src import db
+
+
+# Bump when the tokenization logic changes, to invalidate the cached tokens
+TOKENIZER_VERSION = 1
+
+# Default SQLITE_MAX_VARIABLE_NUMBER of older sqlite3 versions
+SQLITE_MAX_VARIABLES = 999
+
+# (database, version) pairs whose rows of other versions were deleted by this
+# process. A TokenCache is created for every transform, so it can't remember
+# it itself, and the DELETE scans the whole table.
+checked = set()
+checked_lock = threading.Lock()
+
+
+def cache_version(*parts):
+    """
+    Short fingerprint of everything the tokens of a document depend on besides
+    its text, e.g. the spaCy version and the stop-word set.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    h.update(str(TOKENIZER_VERSION).encode())
+    for part in parts:
+        h.update(b'\0')
+        h.update(part.encode())
+    return h.hexdigest()
+
+
+class TokenCache:
+    """
+    Persistent cache of tokenized documents, stored in a side table of the jobs
+    database and keyed by a hash of the document's text and `version`.
+
+    Rows of other versions are deleted the first time a process uses the
+    cache of a database, so upgrading spaCy or changing the stop words
+    invalidates it.
+    """
+    def __init__(self, version, database=None):
+        self.version  = version
+        self.database = database or config.DATABASE
+
+    def key(self, document):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.version.encode())
+        h.update(b'\0')
+        h.update(str(document).encode())
+        return h.hexdigest()
+
+    def check(self):
+        """ Delete the rows of other versions, once per process """
+        with checked_lock:
+            if (self.database, self.version) in checked:
+                return
+            with db.write(self.database) as conn:
+                conn.execute(
+                    f"DELETE FROM {config.TOKEN_CACHE_TABLE} WHERE version != ?",
+                    (self.version,)
+                )
+            checked.add((self.database, self.version))
+
+    def get_many(self, keys):
+        """
+        Returns:
+            Dict of key -> list of tokens, for the keys found in the cache
+        """
+        found = {}
+        keys = list(keys)
+        try:
+            self.check()
+            with db.read(self.database) as conn:
+                for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                    chunk = keys[i:i + SQLITE_MAX_VARIABLES]
+                    rows = conn.execute(
+                        f"SELECT hash, tokens FROM {config.TOKEN_CACHE_TABLE} "
+                        f"WHERE hash IN ({','.join(['?'] * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                    found.update((h, json.loads(tokens)) for h, tokens in rows)
+        except sql.Error as e:
+            print(f"Couldn't read the token cache: {e}")
+        return found
+
+    def put_many(self, tokens):
+        """
+        Args:
+            tokens: Dict of key -> list of tokens
+        """
+        if not tokens:
+            return
+        try:
+            self.check()
+            with db.write(self.database) as conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {config.TOKEN_CACHE_TABLE} "
+                    f"(hash, version, tokens) VALUES (?, ?, ?)",
+                    ((k, self.version, json.dumps(v)) for k, v in tokens.items())
+                )
+        except sql.Error as e:
+            # Several training processes may write at once; the cache is only
+            # an optimization, so losing a write is fine
+            print(f"Couldn't update the token cache: {e}")
@@ -0,0 +1,72 @@
+"""
+Training of the batch model in the background.
+
+A training run trains and registers a new version, and requests keep being
+served by the previous one until the run promotes it. Before that, the model
+is loaded into registry.load_model's cache, so no request loads it. Right
+after, the jobs of the last SCORE_DAYS are scored with it. Scoring is
+serialized (see predictions.scoring_lock), so a /predict made meanwhile waits
+for it and finds the jobs scored instead of scoring them again.
+
+Runs report the stage they're in and the seconds each finished stage took.
+The stage durations are stored in the version's meta.json, and the next run
+estimates its remaining time from them.
+"""
+
+# Built-in imports
+from time import time
+
+# Local imports
+from src import config
+from src import registry
+from src.learner import retrain
+from src.learner import TRAINING_STAGES
+from src.predictions import score_jobs
+from src.scheduler import BackgroundWorker
+from src.scheduler import Stages
+
+
+STAGES = TRAINING_STAGES + ['warm_up']
+
+
+def expected_durations():
+    """ Stage durations of the served version's training, if it recorded them """
+
+    version = registry.current_version()
+    if version is None:
+        return None
+    return registry.load_meta(version).get('stage_seconds')
+
+
+def run_training(run):
+    """ Training task of the background worker """
+
+    stages = Stages(run, STAGES, expected_durations())
+
+    model, version, features = retrain(stages)
+    run.set('version', version)
+
+    with stages.stage('warm_up'):
+        registry.load_model(version)
+        registry.promote(version)
+        since = int(time()) - config.SCORE_DAYS * 24 * 3600
+        run.set('rows_scored', score_jobs(version, since=since))
+
+    registry.update_meta(version, stage_seconds=stages.durations)
+    print(f"Model {version} trained in {sum(stages.durations.values()):.1f} seconds.")
+
+
+def status(run_id=None):
+    """ Status of a training run, with its current estimate of the seconds left """
+
+    status = trainer.status(run_id)
+    if status is not None:
+        status['progress']['eta_seconds'] = (
+            Stages.eta(status['progress']) if status['state'] == 'running' else None
+        )
+    return status
+
+
+# One training at a time; asking for another while one is queued or running
+# returns the id of that one
+trainer = BackgroundWorker('trainer', run_training)
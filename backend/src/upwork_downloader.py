@@ -2,9 +2,10 @@
 from os.path import exists, isfile
 import re
 import os
-import time
-import sqlite3 as sql
+import queue
 from datetime import datetime
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 # External imports
 import upwork
@@ -15,9 +16,21 @@ import requests
 
 # Local imports
 from src import config
-from src.config import SEARCH_TERMS
+from src.planner import active_search_terms
 from src.utils import to_unicode
+from src.crawl_state import CrawlState
+from src import db
+from src.preprocessors import SpacyPreprocessor
+from src.predictions import score_jobs
+from src.dedupe import index_jobs
+from src.rate_limiter import TokenBucket
+from src.rate_limiter import call_with_retries
 from src.exceptions import CredentialsNotFoundError
+from src.exceptions import RateLimitedError
+
+
+# Default SQLITE_MAX_VARIABLE_NUMBER of older sqlite3 versions
+SQLITE_MAX_VARIABLES = 999
 
 
 def load_api_key():
@@ -81,81 +94,249 @@ def load_access_token():
     return access_token, access_token_secret
 
 
-def search_jobs(client, terms):
+def fetch_term(api, term, limiter, on_page=None, crawl_state=None):
+    """
+    Fetch all the result pages of a single search term.
+
+    Args:
+        api        : A search.Api-like object with a `find(params)` method
+        term       : Search term
+        limiter    : TokenBucket shared by all the requests to the API
+        on_page    : Optional callable called as `on_page(term, jobs)` per page
+        crawl_state: Optional CrawlState. When given, only the jobs posted 
+                     after the term's cursor are returned, and paging stops at
+                     the first page without any of them.
+
+    Returns:
+        List of results for the term, and whether all its pages were fetched
+    """
+
+    days_posted = config.DAYS_BACK_TO_SEARCH
+    if crawl_state is not None:
+        days_posted = crawl_state.days_to_search(term)
+
+    results = []
+    for i in range(0, config.MAX_ENTRIES_PER_TERM, config.ENTRIES_PER_RESULT_PAGE):
+        print(f"A new loop for {term}")
+
+        params = {
+            'q'           : term.split(' '),  # Terms treated with AND
+            'job_status'  : 'open',
+            'days_posted' : days_posted,
+            'paging'      : f'{i};{config.ENTRIES_PER_RESULT_PAGE}' # offset;count.
+        }
+        if crawl_state is not None:
+            params['sort'] = 'create_time desc' # Newest first
+
+        def find():
+            limiter.acquire()
+            page = api.find(params)
+            # The client returns the decoded body whatever the HTTP status is
+            error = page.get('error') or {}
+            if str(error.get('status')) == '429' or str(error.get('code')) == '429':
+                raise RateLimitedError
+            return page
+
+        jobs = []
+        try:
+            page = call_with_retries(
+                find,
+                retries = config.API_MAX_RETRIES,
+                backoff = config.API_BACKOFF_SECONDS
+            )
+            jobs = page.get('jobs', [])
+            # Modify the date_created so that the timezone has a format of 
+            # "+00:00" instead of "+0000" since sqlite3 can only parse that
+            for job in jobs:
+                job['date_created'] = datetime.strptime(
+                    job['date_created'], "%Y-%m-%dT%H:%M:%S%z").isoformat()
+
+        except requests.exceptions.ConnectionError as e:
+            print(f'Connection error, are you sure you have internet?')
+            return results, False
+
+        except requests.exceptions.HTTPError as e:
+            print(f'HTTP error when searching for "{term}": {e}')
+            return results, False
+
+        except RateLimitedError as e:
+            # Still throttled after the retries; the crawl cursor resumes the
+            # term on the next download
+            print(f'Rate limited when searching for "{term}": {e}')
+            return results, False
+
+        n_fetched = len(jobs)
+        if crawl_state is not None:
+            jobs = [job for job in jobs if crawl_state.is_new(term, job)]
+
+        results.extend(jobs)
+        if on_page is not None:
+            on_page(term, jobs)
+
+        print(f'Fetched {n_fetched} results ({len(jobs)} new) for term "{term}"')
+
+        if n_fetched < config.ENTRIES_PER_RESULT_PAGE:
+            break
+
+        if crawl_state is not None and not jobs:
+            break # Reached the jobs seen in a previous download
+
+    return results, True
+
+
+def search_jobs(client, terms, on_page=None, api_class=search.Api, incremental=None,
+                crawl_state=None, on_term_done=None):
     """
     Search jobs using the Python Upwork API based on given search terms.
 
+    The terms are searched concurrently by a pool of SEARCH_WORKERS threads
+    that share a token bucket, so the API rate limit is respected no matter how
+    many workers there are. Pages are handed to `on_page` in the calling thread
+    as soon as they arrive, which lets the caller store them while the rest of 
+    the terms are still being fetched.
+
     Args:
-        client: An authenticated upwork.Client object
-        terms : List of terms to use in the searches.
+        client     : An authenticated upwork.Client object
+        terms      : List of terms to use in the searches.
+        on_page    : Optional callable called as `on_page(term, jobs)` per page
+        api_class  : Class used to query the API, replaceable for benchmarks
+        incremental: Only fetch jobs newer than the last ones seen per term.
+                     Defaults to config.INCREMENTAL_DOWNLOAD.
+        crawl_state: CrawlState used in incremental mode. Defaults to the one
+                     stored in the jobs database.
+        on_term_done: Optional callable called as `on_term_done(term, complete)`
+                     once all the pages of a term were handed to on_page
     
     Returns:
-        List of results
+        List of distinct results
     """
 
+    if incremental is None:
+        incremental = config.INCREMENTAL_DOWNLOAD
+    if not incremental:
+        crawl_state = None
+    elif crawl_state is None:
+        crawl_state = CrawlState().load()
+
+    limiter = TokenBucket(config.API_REQUESTS_PER_SECOND, config.API_BURST)
+    api = api_class(client)
+    pages = queue.Queue()
+
+    def worker(term):
+        complete = False
+        try:
+            _, complete = fetch_term(
+                api, term, limiter, lambda t, jobs: pages.put((t, jobs)), crawl_state)
+        finally:
+            pages.put((term, complete)) # The term is done
+
     final_results = []
-    for term in terms:
-
-        for i in range(0, config.MAX_ENTRIES_PER_TERM, config.ENTRIES_PER_RESULT_PAGE):
-            print(f"A new loop for {term}")
-            time.sleep(1.5) # Default API limit
-
-            params = {
-                'q'           : term.split(' '),  # Terms treated with AND
-                'job_status'  : 'open',
-                'days_posted' : config.DAYS_BACK_TO_SEARCH,
-                'paging'      : f'{i};{config.ENTRIES_PER_RESULT_PAGE}' # offset;count.
-            }
-
-            try:
-                results = search.Api(client).find(params)
-                jobs = results.get('jobs', [])
-                # Modify the date_created so that the timezone has a format of 
-                # "+00:00" instead of "+0000" since sqlite3 can only parse that
-                for job in jobs:
-                    job['date_created'] = datetime.strptime(
-                        job['date_created'], "%Y-%m-%dT%H:%M:%S%z").isoformat()
-                final_results.extend(jobs)
-            
-            except requests.exceptions.ConnectionError as e:
-                print(f'Connection error, are you sure you have internet?')
-
-            print(f'Fetched {len(jobs)} results for term "{term}"')
-
-            if len(jobs) < config.ENTRIES_PER_RESULT_PAGE:
-                break
-    
+    final_ids = set()
+    with ThreadPoolExecutor(max_workers=config.SEARCH_WORKERS) as executor:
+        futures = [executor.submit(worker, term) for term in terms]
+
+        pending = len(futures)
+        while pending > 0:
+            term, jobs = pages.get()
+
+            if isinstance(jobs, bool):
+                pending -= 1
+                if crawl_state is not None:
+                    # Only after the term's pages were handed to on_page
+                    if jobs:
+                        crawl_state.commit(term)
+                    else:
+                        crawl_state.discard(term)
+                if on_term_done is not None:
+                    on_term_done(term, jobs)
+                continue
+
+            for job in jobs:
+                if job['id'] not in final_ids:
+                    final_ids.add(job['id'])
+                    final_results.append(job)
+            if on_page is not None:
+                on_page(term, jobs)
+            if crawl_state is not None:
+                crawl_state.observe(term, jobs)
+
+        # Propagate unexpected errors raised inside the workers
+        for future in futures:
+            future.result()
+
     return final_results
 
 
-def add_records(records):
+def record_to_row(record):
+    """ Flatten a job returned by the API into the columns of FIELDS_NAMES """
+
+    row = []
+    for field in config.FIELDS_NAMES:
+        if 'client' in field:
+            field = field.split('.')[1]
+            value = record.get('client').get(field, '')
+        else:
+            value = record.get(field, '')
+            if field == 'label':
+                value = 'Uncategorized'
+            elif field == 'skills':
+                value = "; ".join(value)
+        row.append(value)
+    return row
+
+
+def existing_ids(cur, ids):
+    """ Subset of `ids` that are already stored in the jobs table """
+
+    found = set()
+    ids = list(ids)
+    for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+        chunk = ids[i:i + SQLITE_MAX_VARIABLES]
+        cur.execute(
+            f"SELECT id FROM {config.TABLE_NAME} WHERE id IN ({','.join(['?'] * len(chunk))})",
+            chunk
+        )
+        found.update(row[0] for row in cur.fetchall())
+    return found
+
+
+def add_records(records, term=None, seen=None):
     """
     Insert records in sqlite3 database.
 
+    Jobs are deduplicated by id before being flattened: repeated ids within 
+    `records`, ids in `seen` and ids already in the database are only recorded
+    in the job-term table, not inserted again.
+
     Args:
-    data: a list of tuples
+        records: List of jobs as returned by the API
+        term   : Search term that matched the records
+        seen   : Set of ids stored so far in the current download, updated 
+                 in place. Lets a download skip the jobs that several of its
+                 terms have in common.
+
+    Returns:
+        Number of inserted jobs
     """
 
-    # Transform the data into a list of lists
-    data = []
+    if seen is None:
+        seen = set()
+
+    unique = {}
     for record in records:
-        row = []
-        for field in config.FIELDS_NAMES:
-            if 'client' in field:
-                field = field.split('.')[1]
-                value = record.get('client').get(field, '')
-            else:
-                value = record.get(field, '')
-                if field == 'label':
-                    value = 'Uncategorized'
-                elif field == 'skills':
-                    value = "; ".join(value)
-            row.append(value)
-        data.append(row)
+        if record['id'] not in seen:
+            unique.setdefault(record['id'], record)
 
     try:
-        with sql.connect(config.DATABASE) as conn:
+        with db.write() as conn:
             cur = conn.cursor()
+
+            # Don't flatten jobs downloaded in a previous run
+            for job_id in existing_ids(cur, unique):
+                del unique[job_id]
+
+            # Transform the data into a list of lists
+            data = [record_to_row(record) for record in unique.values()]
     
             # Insert records with id that don't exist (id is the primary key)
             insert_sql = "INSERT OR IGNORE INTO {} ({}) VALUES ({})".format(
@@ -166,13 +347,87 @@ def add_records(records):
 
             # Bulk insert
             cur.executemany(insert_sql, data)
-            conn.commit()
+            inserted = max(cur.rowcount, 0)
+
+            if term is not None:
+                cur.executemany(
+                    f"INSERT OR IGNORE INTO {config.JOB_TERMS_TABLE} (job_id, term) VALUES (?, ?)",
+                    ((record['id'], term) for record in records)
+                )
+
+        seen.update(record['id'] for record in records)
+        return inserted
     
     except Exception as e:
         print(e)
+        return 0
 
 
-if __name__ == "__main__":
+def download_jobs(client, terms, api_class=search.Api, progress=None):
+    """
+    Search jobs for all the terms and store them as they arrive.
+
+    Args:
+        client   : An authenticated upwork.Client object
+        terms    : List of terms to use in the searches
+        api_class: Class used to query the API, replaceable for benchmarks
+        progress : Optional scheduler.Run that gets the number of terms done,
+                   pages fetched and rows inserted, and the terms that failed
+
+    Returns:
+        Number of inserted jobs
+    """
+
+    seen = set()
+    inserted = 0
+    preprocessor = SpacyPreprocessor() if config.TOKENIZE_AT_INGEST else None
+    if progress is not None:
+        progress.set('terms', len(terms))
+        for key in ['terms_done', 'pages_fetched', 'rows_inserted']:
+            progress.set(key, 0)
+
+    def store(term, jobs):
+        nonlocal inserted
+        new_jobs = [job for job in jobs if job['id'] not in seen]
+        n = add_records(jobs, term, seen)
+        if preprocessor is not None and new_jobs:
+            # Fill the token cache, so training and predicting don't have to
+            preprocessor.transform([job['title'] for job in new_jobs])
+            preprocessor.transform([job['snippet'] for job in new_jobs])
+        inserted += n
+        print(f'Stored {n} new jobs out of {len(jobs)} for term "{term}"')
+        if progress is not None:
+            progress.increment('pages_fetched')
+            progress.increment('rows_inserted', n)
+
+    def term_done(term, complete):
+        if progress is not None:
+            progress.increment('terms_done')
+            if not complete:
+                progress.error(f'Could not fetch all the pages of "{term}"')
+
+    search_jobs(client, terms, on_page=store, api_class=api_class, on_term_done=term_done)
+    print(f'Stored {inserted} new jobs, {len(seen)} distinct jobs found')
+
+    if config.DEDUPE_AT_INGEST:
+        # Link the new jobs to their near-duplicates, before scoring them
+        # since some may get the label of a labeled duplicate
+        clustered, duplicates = index_jobs(preprocessor)
+        if progress is not None:
+            progress.set('rows_duplicated', duplicates)
+
+    if config.SCORE_AT_INGEST:
+        # Score the new jobs with the served model, if there is one yet
+        since = datetime.now(tz=timezone('UTC')) - timedelta(days=config.SCORE_DAYS)
+        scored = score_jobs(since=int(since.timestamp()))
+        if progress is not None:
+            progress.set('rows_scored', scored)
+
+    return inserted
+
+
+def create_client():
+    """ Create an upwork.Client authenticated with the local credentials """
 
     api_key, api_key_secret = load_api_key()
 
@@ -185,6 +440,8 @@ if __name__ == "__main__":
         'access_token_secret': access_token_secret
     })
 
-    client = upwork.Client(client_config)
-    jobs = search_jobs(client, SEARCH_TERMS)
-    add_records(jobs)
\ No newline at end of file
+    return upwork.Client(client_config)
+
+
+if __name__ == "__main__":
+    download_jobs(create_client(), active_search_terms())
\ No newline at end of file
@@ -1,23 +1,110 @@
 import pandas as pd
-import sqlite3 as sql
-from src.config import DATABASE
+from src import db
 from src.config import TABLE_NAME
+from src.config import DATA_VERSION_TABLE
+from src.config import NUMERIC_COLUMNS
+from src.config import TEXT_COLUMNS
+from src.config import CATEGORICAL_COLUMNS
+from src.config import LOAD_CHUNK_SIZE
+
+# Columns consumed by the model's ColumnTransformer
+MODEL_COLUMNS = NUMERIC_COLUMNS + TEXT_COLUMNS + CATEGORICAL_COLUMNS
+
+# Columns of the labeled data: the model's plus the ones used to select it
+TRAINING_COLUMNS = ['id', 'label', 'created_epoch', 'cluster_id'] + MODEL_COLUMNS
+
+COLUMN_DTYPES = {
+    **{column: 'float32' for column in NUMERIC_COLUMNS},
+    **{column: 'category' for column in CATEGORICAL_COLUMNS},
+}
 
 def to_unicode(s):
     return(unicode(s).encode('utf-8'))
 
 
-def load_database_data(filter=['Good', 'Bad', 'Maybe']):
-    """ Load data from the sqlite database based on """
+def iter_jobs(where, params=(), columns=None, chunk_size=None):
+    """
+    Read jobs in chunks, as DataFrames with compact dtypes: float32 numbers
+    and categorical categories.
+
+    Args:
+        where     : SQL condition on the jobs table, e.g. "label = ?"; it may
+                    end with an ORDER BY clause
+        params    : Parameters of `where`
+        columns   : Columns to read, by default TRAINING_COLUMNS
+        chunk_size: Rows per chunk, by default LOAD_CHUNK_SIZE
+
+    Yields:
+        DataFrames of up to `chunk_size` rows
+    """
+
+    columns = columns or TRAINING_COLUMNS
+    chunk_size = chunk_size or LOAD_CHUNK_SIZE
+    quoted = ','.join(f'"{column}"' for column in columns)
+    select_sql = f"SELECT {quoted} FROM {TABLE_NAME} WHERE {where}"
+
+    with db.read() as conn:
+        cur = conn.execute(select_sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            yield chunk.astype({c: t for c, t in COLUMN_DTYPES.items() if c in chunk})
+
+
+def concat_chunks(chunks, columns=None):
+    """
+    Concatenate chunks of `iter_jobs`, keeping their categorical columns
+    categorical: pandas turns them into objects when the categories of the
+    chunks differ.
+    """
+
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame(columns=columns or TRAINING_COLUMNS)
+
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals(
+                [chunk[column] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def load_database_data(filter=['Good', 'Bad', 'Maybe'], columns=None):
+    """
+    Load the jobs with the given labels from the sqlite database, newest
+    first, with only the columns used to train the model by default.
+    """
 
     try:
-        cur = sql.connect(DATABASE).cursor()
-        filter = ','.join(f'"{f}"' for f in filter)
-        select_sql = f"SELECT * FROM {TABLE_NAME} WHERE label IN ({filter}) ORDER BY strftime('%Y-%m-%dT%H:%M:%SZ', date_created) DESC"
-        cur.execute(select_sql)
-        rows = cur.fetchall()
-        names = names = [description[0] for description in cur.description]
-        df = pd.DataFrame(rows, columns=names)
-        return df
+        placeholders = ','.join('?' * len(filter))
+        chunks = iter_jobs(
+            f"label IN ({placeholders}) ORDER BY created_epoch DESC, id DESC",
+            filter, columns
+        )
+        return concat_chunks(chunks, columns)
     except Exception as e:
-        print(f"Error in SELECT operation: {e}")
\ No newline at end of file
+        print(f"Error in SELECT operation: {e}")
+
+
+def data_fingerprint(filter=['Good', 'Bad', 'Maybe']):
+    """
+    Identify the current labeled data by its number of rows, its largest rowid
+    and the number of label changes so far. Any new label or relabeling gives
+    a different fingerprint.
+    """
+
+    with db.read() as conn:
+        filter = ','.join(f'"{f}"' for f in filter)
+        count, max_rowid = conn.execute(
+            f"SELECT COUNT(*), MAX(rowid) FROM {TABLE_NAME} WHERE label IN ({filter})"
+        ).fetchone()
+        changes, = conn.execute(
+            f"SELECT value FROM {DATA_VERSION_TABLE} WHERE key = 'label_changes'"
+        ).fetchone()
+
+    return f"{count}-{max_rowid}-{changes}"